@@ -4,3 +4,16 @@ from django.apps import AppConfig
 class StoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'store'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save, pre_delete
+        from .currency import invalidate_rates
+        from .models import Cart, ExchangeRate
+        from .profiling import check_profile_settings
+        from .services import release_deleted_cart_stock
+
+        check_profile_settings()
+
+        post_save.connect(invalidate_rates, sender=ExchangeRate, dispatch_uid='store.invalidate_rates_on_save')
+        post_delete.connect(invalidate_rates, sender=ExchangeRate, dispatch_uid='store.invalidate_rates_on_delete')
+        pre_delete.connect(release_deleted_cart_stock, sender=Cart, dispatch_uid='store.release_deleted_cart_stock')
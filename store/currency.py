@@ -0,0 +1,142 @@
+import json
+import threading
+import time
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .models import ExchangeRate
+
+TWO_PLACES = Decimal('0.01')
+
+# Rates of every currency against BASE_CURRENCY, shared by the threads of this process
+_cache = {'version': None, 'rates': None, 'checked_at': 0.0}
+_cache_lock = threading.Lock()
+
+
+def rates_version():
+    """
+    Return a cheap fingerprint of the exchange rate table that changes whenever a rate is saved or deleted.
+    """
+    version = ExchangeRate.objects.aggregate(updated=Max('updated_at'), count=Count('pk'))
+    return version['updated'], version['count']
+
+
+def get_rates():
+    """
+    Return {currency: units per base currency unit}, including the base currency itself.
+
+    The table is cached in-process. At most every EXCHANGE_RATE_CHECK_SECONDS the cache compares the
+    table's version with its own and reloads only when it changed, so rates edited by another process are
+    picked up within that interval. Changes made in this process invalidate the cache immediately.
+    """
+    with _cache_lock:
+        now = time.monotonic()
+        if _cache['rates'] is None or now - _cache['checked_at'] >= settings.EXCHANGE_RATE_CHECK_SECONDS:
+            version = rates_version()
+            if _cache['rates'] is None or version != _cache['version']:
+                rates = dict(ExchangeRate.objects.values_list('currency', 'rate'))
+                rates[settings.BASE_CURRENCY] = Decimal(1)
+                _cache['rates'], _cache['version'] = rates, version
+            _cache['checked_at'] = now
+        return _cache['rates']
+
+
+def invalidate_rates(**kwargs):
+    """
+    Drop the cached rates; connected to ExchangeRate saves and deletes.
+    """
+    with _cache_lock:
+        _cache['rates'] = None
+
+
+def normalize_currency(currency):
+    return str(currency or settings.BASE_CURRENCY).strip().upper()
+
+
+def get_rate(currency):
+    """
+    Return the rate for converting base currency amounts into the given currency (default: the base).
+
+    Raises:
+        ValueError: If there is no rate for the currency.
+    """
+    currency = normalize_currency(currency)
+    rates = get_rates()
+    if currency not in rates:
+        raise ValueError(f"Unsupported currency '{currency}'.")
+    return rates[currency]
+
+
+def round_amount(amount):
+    return amount.quantize(TWO_PLACES, rounding=ROUND_HALF_UP)
+
+
+def convert_amount(amount, rate):
+    """
+    Convert a base currency amount with the given rate, rounded half-up to cents.
+    """
+    if amount is None:
+        return None
+    return round_amount(Decimal(amount) * rate)
+
+
+def convert_rows(rows, fields, rate):
+    """
+    Convert the given amount fields of every row dict in place with one rate, e.g. a whole report.
+
+    The rate is looked up once by the caller, so converting a result set costs one multiplication per
+    amount and no per-row rate lookups.
+    """
+    if rate == 1:
+        return rows
+    for row in rows:
+        for field in fields:
+            row[field] = convert_amount(row[field], rate)
+    return rows
+
+
+def load_rates_file(path):
+    """
+    Load exchange rates from a JSON file like {"base": "USD", "rates": {"EUR": "0.92", ...}}.
+
+    Currencies in the file are created or updated in one statement; others are left alone.
+
+    Returns:
+        int: The number of rates loaded.
+
+    Raises:
+        ValueError: If the file is malformed or uses another base currency.
+    """
+    with open(path) as rates_file:
+        try:
+            data = json.load(rates_file)
+        except json.JSONDecodeError as e:
+            raise ValueError(f'Invalid exchange rate file: {e}')
+
+    if not isinstance(data, dict) or not isinstance(data.get('rates'), dict):
+        raise ValueError('Exchange rate file must contain a "rates" object.')
+    base = normalize_currency(data.get('base'))
+    if base != settings.BASE_CURRENCY:
+        raise ValueError(f'Exchange rates are against {base}, but BASE_CURRENCY is {settings.BASE_CURRENCY}.')
+
+    rates = []
+    for currency, rate in data['rates'].items():
+        currency = normalize_currency(currency)
+        try:
+            rate = Decimal(str(rate))
+        except InvalidOperation:
+            raise ValueError(f'Invalid rate for {currency}: {rate!r}.')
+        # NaN cannot be compared and would raise InvalidOperation, which is not a ValueError
+        if len(currency) != 3 or not currency.isalpha() or not rate.is_finite() or not rate > 0:
+            raise ValueError(f'Invalid rate for {currency}: {rate}.')
+        if currency != settings.BASE_CURRENCY:
+            rates.append(ExchangeRate(currency=currency, rate=rate))
+
+    ExchangeRate.objects.bulk_create(
+        rates, update_conflicts=True, unique_fields=['currency'], update_fields=['rate', 'updated_at']
+    )
+    # Bulk writes send no model signals
+    invalidate_rates()
+    return len(rates)
@@ -0,0 +1,148 @@
+import gzip
+import json
+import os
+from datetime import date, datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Count, Max
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from store.models import ArchivedOrderPeriod, Order, UserOrderCounter
+from store.routers import use_primary
+from store.partitioning import (
+    add_months,
+    archive_table_name,
+    detach_partition,
+    is_partitioned,
+    list_partitions,
+    month_start,
+)
+
+
+def month_range(start):
+    """
+    Return the aware datetimes bounding the month that begins on start.
+    """
+    return (
+        timezone.make_aware(datetime.combine(start, time.min)),
+        timezone.make_aware(datetime.combine(add_months(start, 1), time.min)),
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Move closed monthly periods out of the Order table. Partitioned tables on PostgreSQL have their '
+        'partitions detached into archive tables; with --output-dir orders are written to gzipped JSON lines '
+        'files and removed from the table.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-months', type=int, default=12, help='Number of closed months to keep before the current one.'
+        )
+        parser.add_argument('--output-dir', help='Directory for orders-YYYY-MM.jsonl.gz archive files.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows deleted per statement.')
+
+    def handle(self, *args, **options):
+        keep_months = options['keep_months']
+        if keep_months < 0:
+            raise CommandError('--keep-months must not be negative.')
+
+        output_dir = options['output_dir']
+        partitioned = is_partitioned()
+        if not partitioned and not output_dir:
+            raise CommandError('--output-dir is required unless the Order table is partitioned.')
+
+        cutoff = add_months(month_start(date.today()), -keep_months)
+        # Rows are exported and counted from these reads and then deleted on the primary, so a lagging replica
+        # would lose orders
+        with use_primary():
+            for start in self.closed_periods(cutoff, partitioned):
+                self.create_missing_counters(start)
+                if output_dir:
+                    location, order_count, max_order_number = self.archive_to_file(
+                        start, output_dir, options['batch_size'], partitioned
+                    )
+                else:
+                    location, order_count, max_order_number = self.archive_to_table(start)
+
+                period, created = ArchivedOrderPeriod.objects.get_or_create(
+                    period_start=start,
+                    defaults={'order_count': order_count, 'max_order_number': max_order_number, 'location': location},
+                )
+                if not created:
+                    period.order_count += order_count
+                    period.max_order_number = max(period.max_order_number, max_order_number)
+                    period.save()
+
+                self.stdout.write(f'Archived {order_count} orders from {start:%Y-%m} to {location}')
+
+    def closed_periods(self, cutoff, partitioned):
+        if partitioned:
+            return [start for start in list_partitions() if start < cutoff]
+        cutoff_at, _ = month_range(cutoff)
+        months = (
+            Order.objects.filter(created_at__lt=cutoff_at)
+            .annotate(month=TruncMonth('created_at'))
+            .values_list('month', flat=True)
+            .distinct()
+        )
+        return sorted({month_start(timezone.localtime(month)) for month in months})
+
+    def create_missing_counters(self, start):
+        """
+        Create order counters for the period's users who have none, while their orders are still counted.
+
+        A missing counter is created from the user's live orders, which no longer include archived ones.
+        """
+        begin, end = month_range(start)
+        period_users = Order.objects.filter(created_at__gte=begin, created_at__lt=end).values('user')
+        order_counts = (
+            Order.objects.filter(user__in=period_users)
+            .exclude(user__in=UserOrderCounter.objects.values('user'))
+            .order_by()
+            .values('user')
+            .annotate(order_count=Count('id'))
+        )
+        UserOrderCounter.objects.bulk_create(
+            [UserOrderCounter(user_id=row['user'], order_count=row['order_count']) for row in order_counts],
+            ignore_conflicts=True,
+        )
+
+    def period_stats(self, orders):
+        stats = orders.aggregate(order_count=Count('id'), max_order_number=Max('order_number'))
+        return stats['order_count'], stats['max_order_number'] or 0
+
+    def archive_to_table(self, start):
+        begin, end = month_range(start)
+        order_count, max_order_number = self.period_stats(Order.objects.filter(created_at__gte=begin, created_at__lt=end))
+        with transaction.atomic():
+            detach_partition(start)
+        return archive_table_name(start), order_count, max_order_number
+
+    def archive_to_file(self, start, output_dir, batch_size, partitioned):
+        begin, end = month_range(start)
+        orders = Order.objects.filter(created_at__gte=begin, created_at__lt=end).order_by('pk')
+        order_count, max_order_number = self.period_stats(orders)
+
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, f'orders-{start:%Y-%m}.jsonl.gz')
+        # Append a new gzip member so re-archiving late rows for a month never overwrites earlier ones
+        with gzip.open(path, 'at', encoding='utf-8') as archive:
+            for row in orders.values().iterator(chunk_size=batch_size):
+                archive.write(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
+
+        if partitioned:
+            with transaction.atomic():
+                detach_partition(start)
+                with connection.cursor() as cursor:
+                    cursor.execute(f'DROP TABLE {connection.ops.quote_name(archive_table_name(start))}')
+        else:
+            pks = list(orders.values_list('pk', flat=True))
+            for offset in range(0, len(pks), batch_size):
+                Order.objects.filter(pk__in=pks[offset:offset + batch_size]).delete()
+
+        return path, order_count, max_order_number
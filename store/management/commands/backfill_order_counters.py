@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+
+from store.models import ArchivedOrderPeriod, Order, UserOrderCounter
+from store.routers import use_primary
+
+
+class Command(BaseCommand):
+    help = "Rebuild every user's order counter from their existing orders."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Counters written per statement.')
+
+    def handle(self, *args, **options):
+        # The counts overwrite the counters, so they must not come from a lagging replica
+        with use_primary():
+            if ArchivedOrderPeriod.objects.exists():
+                # Archived orders are no longer counted, so a rebuild would lower counters and repeat order numbers
+                raise CommandError(
+                    'Orders have been archived; order counters can only be rebuilt before the first archive_orders run.'
+                )
+
+            order_counts = Order.objects.order_by().values('user').annotate(order_count=Count('id'))
+            counters = [
+                UserOrderCounter(user_id=row['user'], order_count=row['order_count']) for row in order_counts
+            ]
+
+            with transaction.atomic():
+                UserOrderCounter.objects.bulk_create(
+                    counters,
+                    batch_size=options['batch_size'],
+                    update_conflicts=True,
+                    unique_fields=['user'],
+                    update_fields=['order_count'],
+                )
+
+        self.stdout.write(self.style.SUCCESS(f'Backfilled order counters for {len(counters)} users.'))
@@ -0,0 +1,76 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+
+from store.models import Product
+from store.services import CartService
+
+
+class Command(BaseCommand):
+    help = (
+        'Concurrent writers adding to one cart: the read-modify-write add_items_to_cart path against the '
+        'append-only event log. Reports writes/s and whether any update was lost. Creates its own user and '
+        'product and deletes them afterwards; meant for a Postgres database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help='Concurrent writers (devices) for the cart.')
+        parser.add_argument('--writes', type=int, default=100, help='Single-unit adds per writer.')
+
+    def handle(self, *args, **options):
+        writers, writes = options['writers'], options['writes']
+        if writers < 1 or writes < 1:
+            raise CommandError('--writers and --writes must be positive integers.')
+
+        paths = {
+            'update': lambda user, product: CartService.add_items_to_cart(
+                user, [{'product_id': product.pk, 'quantity': 1}]
+            ),
+            'event log': lambda user, product: CartService.record_cart_events(
+                user, [{'product_id': product.pk, 'action': 'add', 'quantity': 1}]
+            ),
+        }
+
+        self.stdout.write(f'{"path":<12}{"writes/s":>10}{"errors":>8}{"quantity":>10}{"expected":>10}{"fold ms":>9}')
+        for name, write in paths.items():
+            self.run(name, write, writers, writes)
+
+    def run(self, name, write, writers, writes):
+        user = User.objects.create_user(username=f'cart-write-benchmark-{time.time_ns()}')
+        product = Product.objects.create(name='Cart write benchmark product', price=Decimal('1.00'))
+
+        def writer(_):
+            errors = 0
+            try:
+                for _ in range(writes):
+                    try:
+                        write(user, product)
+                    except DatabaseError:
+                        errors += 1
+            finally:
+                connection.close()
+            return errors
+
+        try:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=writers) as executor:
+                errors = sum(executor.map(writer, range(writers)))
+            elapsed = time.perf_counter() - started
+
+            # The event log pays for the read-modify-write once, when the events are applied
+            started = time.perf_counter()
+            cart = CartService.apply_cart_events(user)
+            fold_ms = (time.perf_counter() - started) * 1000
+
+            quantity = cart.items.get().quantity if cart and cart.items.exists() else 0
+            expected = writers * writes - errors
+            self.stdout.write(
+                f'{name:<12}{writers * writes / elapsed:>10.0f}{errors:>8}{quantity:>10}{expected:>10}{fold_ms:>9.1f}'
+            )
+        finally:
+            user.delete()
+            product.delete()
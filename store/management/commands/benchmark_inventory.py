@@ -0,0 +1,85 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Sum
+from django.test.utils import override_settings
+
+from store.models import Cart, CartItem, Product, StockReservation
+from store.services import InventoryService
+
+
+class Command(BaseCommand):
+    help = (
+        'Flash-sale benchmark: concurrent buyers reserve and check out one product, once with a single stock '
+        'counter and once with striped counters. Reports throughput and checks nothing was oversold. Creates '
+        'its own users, carts and product and deletes them afterwards; meant for a Postgres database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buyers', type=int, default=500, help='Buyers, each wanting one unit.')
+        parser.add_argument('--stock', type=int, default=400, help='Units on sale.')
+        parser.add_argument('--threads', type=int, default=32, help='Concurrent database connections.')
+        parser.add_argument(
+            '--stripes', type=int, action='append',
+            help='Stripe counts to compare; may be given several times (default: 1 and INVENTORY_STOCK_STRIPES).'
+        )
+
+    def handle(self, *args, **options):
+        if min(options['buyers'], options['stock'], options['threads']) < 1:
+            raise CommandError('--buyers, --stock and --threads must be positive integers.')
+
+        self.stdout.write(f'{"stripes":>8}{"sold":>8}{"left":>8}{"errors":>8}{"seconds":>10}{"buyers/s":>10}')
+        for stripes in options['stripes'] or [1, settings.INVENTORY_STOCK_STRIPES]:
+            with override_settings(INVENTORY_STOCK_STRIPES=stripes):
+                self.run(stripes, options['buyers'], options['stock'], options['threads'])
+
+    def run(self, stripes, buyers, stock, threads):
+        product = Product.objects.create(name=f'Benchmark product ({stripes} stripes)', price=Decimal('10.00'))
+        users = User.objects.bulk_create(User(username=f'inventory-benchmark-{stripes}-{n}') for n in range(buyers))
+        carts = Cart.objects.bulk_create(Cart(user=user) for user in users)
+        # Checkout sells what the cart's lines need and returns any other reserved stock
+        CartItem.objects.bulk_create(
+            CartItem(cart=cart, product=product, quantity=1, unit_price=product.price) for cart in carts
+        )
+        InventoryService.set_stock(product, stock)
+
+        def buy(cart):
+            # Reserve on add to cart, then convert at checkout, each in its own transaction like the API does
+            try:
+                with transaction.atomic():
+                    InventoryService.reserve(cart, product.pk, 1)
+                with transaction.atomic():
+                    InventoryService.convert_cart_reservations(cart)
+                return 'sold'
+            except ValueError:
+                return 'out of stock'
+            except DatabaseError:
+                return 'error'
+            finally:
+                connection.close()
+
+        try:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                outcomes = list(executor.map(buy, carts))
+            elapsed = time.perf_counter() - started
+
+            sold = outcomes.count('sold')
+            left = InventoryService.available_stock(product)
+            # Buyers whose checkout failed after reserving still hold their units
+            held = StockReservation.objects.filter(stock_stripe__product=product).aggregate(n=Sum('quantity'))['n'] or 0
+            self.stdout.write(
+                f'{stripes:>8}{sold:>8}{left:>8}{outcomes.count("error"):>8}{elapsed:>10.2f}{buyers / elapsed:>10.0f}'
+            )
+            if sold + left + held != stock:
+                raise CommandError(
+                    f'Stock mismatch with {stripes} stripes: {sold} sold + {left} left + {held} held != {stock}.'
+                )
+        finally:
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+            product.delete()
@@ -0,0 +1,83 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from store.models import Cart, CartItem, CouponCode, Order, Product
+from store.renderers import FastJSONRenderer, orjson
+from store.serializers import (
+    CartSerializer,
+    CouponCodeSerializer,
+    FlatCartSerializer,
+    FlatCouponCodeSerializer,
+    FlatOrderSerializer,
+    OrderSerializer,
+)
+
+
+def build_objects(count):
+    """
+    Build unsaved model instances so the benchmark measures serialization only, not queries.
+    """
+    now = timezone.now()
+    coupons = [
+        CouponCode(id=i, code=f'CODE{i:06d}', order_n=i % 10 + 1, discount_percentage=Decimal('10.00'))
+        for i in range(count)
+    ]
+    orders = [
+        Order(
+            id=i,
+            user_id=i,
+            discount_code=coupons[i] if i % 2 else None,
+            total_amount=Decimal('199.99'),
+            total_discount_amount=Decimal('20.00'),
+            total_items_purchased=3,
+            created_at=now,
+            order_number=i + 1,
+        )
+        for i in range(count)
+    ]
+    products = [Product(id=i, name=f'Product {i}', price=Decimal('49.99')) for i in range(3)]
+    carts = []
+    for i in range(count):
+        cart = Cart(id=i, user_id=i, total_amount=Decimal('149.97'))
+        items = [CartItem(id=i * 3 + n, cart=cart, product=product, quantity=1) for n, product in enumerate(products)]
+        # Pretend the items were prefetched so both serializers read them without a query
+        cart._prefetched_objects_cache = {'items': CartItem.objects.none()}
+        cart._prefetched_objects_cache['items']._result_cache = items
+        carts.append(cart)
+    return {'Order': orders, 'CouponCode': coupons, 'Cart': carts}
+
+
+class Command(BaseCommand):
+    help = 'Microbenchmark ModelSerializer + JSONRenderer against the flat serializers + FastJSONRenderer.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=10000, help='Objects serialized per run.')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per case; the fastest is reported.')
+
+    def handle(self, *args, **options):
+        count = options['count']
+        objects = build_objects(count)
+        cases = {
+            'Order': (OrderSerializer, FlatOrderSerializer),
+            'CouponCode': (CouponCodeSerializer, FlatCouponCodeSerializer),
+            'Cart': (CartSerializer, FlatCartSerializer),
+        }
+
+        self.stdout.write(f'orjson: {"installed" if orjson else "not installed, using the stdlib fallback"}')
+        self.stdout.write(f'{"model":<12}{"before ms":>12}{"after ms":>12}{"speedup":>10}  (per {count} objects)')
+        for name, (model_serializer, flat_serializer) in cases.items():
+            before = self.measure(model_serializer, JSONRenderer(), objects[name], options['repeat'])
+            after = self.measure(flat_serializer, FastJSONRenderer(), objects[name], options['repeat'])
+            self.stdout.write(f'{name:<12}{before * 1000:>12.1f}{after * 1000:>12.1f}{before / after:>9.1f}x')
+
+    def measure(self, serializer_class, renderer, instances, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            renderer.render(serializer_class(instances, many=True).data)
+            timings.append(time.perf_counter() - started)
+        return min(timings)
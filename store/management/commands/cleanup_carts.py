@@ -0,0 +1,65 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from store.models import Cart, CartItem, StockReservation
+from store.services import InventoryService
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete expired carts and their items in small batches, returning any stock they still hold. Each batch is its own short transaction and '
+        'skips carts that are locked by a concurrent request.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Carts deleted per transaction.')
+        parser.add_argument('--sleep', type=float, default=0.1, help='Seconds to pause between batches.')
+        parser.add_argument('--max-batches', type=int, help='Stop after this many batches.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be a positive integer.')
+
+        cutoff = Cart.expiry_cutoff()
+        carts_deleted = items_deleted = batches = 0
+        started = time.monotonic()
+
+        while options['max_batches'] is None or batches < options['max_batches']:
+            candidates = list(
+                Cart.objects.filter(updated_at__lt=cutoff).order_by('updated_at').values_list('pk', flat=True)[
+                    :batch_size
+                ]
+            )
+            if not candidates:
+                break
+
+            with transaction.atomic():
+                # Re-check the cutoff under lock so a cart touched since it was selected survives
+                cart_ids = list(
+                    Cart.objects.select_for_update(skip_locked=True)
+                    .filter(pk__in=candidates, updated_at__lt=cutoff)
+                    .values_list('pk', flat=True)
+                )
+                InventoryService.release(StockReservation.objects.filter(cart_id__in=cart_ids))
+                items_deleted += CartItem.objects.filter(cart_id__in=cart_ids).delete()[0]
+                carts_deleted += Cart.objects.filter(pk__in=cart_ids).delete()[0]
+
+            batches += 1
+            if not cart_ids:
+                # Every remaining candidate is locked by a request; leave them for the next run
+                break
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        elapsed = time.monotonic() - started
+        rows = carts_deleted + items_deleted
+        rate = rows / elapsed if elapsed else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Deleted {carts_deleted} carts and {items_deleted} cart items in {batches} batches '
+                f'({elapsed:.2f}s, {rate:.0f} rows/s).'
+            )
+        )
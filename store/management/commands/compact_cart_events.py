@@ -0,0 +1,38 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from store.models import CartEvent
+from store.services import CartService
+
+
+class Command(BaseCommand):
+    help = (
+        'Apply pending cart events to their carts and delete them, keeping the event log short. Each cart is '
+        'folded in its own transaction; run it periodically, e.g. from cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Users whose events are read per round.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be a positive integer.')
+
+        compacted = 0
+        last_user_id = 0
+        while True:
+            user_ids = list(
+                CartEvent.objects.filter(user_id__gt=last_user_id)
+                .order_by('user_id')
+                .values_list('user_id', flat=True)
+                .distinct()[:options['batch_size']]
+            )
+            if not user_ids:
+                break
+
+            for user in User.objects.filter(pk__in=user_ids):
+                CartService.apply_cart_events(user)
+                compacted += 1
+            last_user_id = user_ids[-1]
+
+        self.stdout.write(self.style.SUCCESS(f'Compacted the event logs of {compacted} carts.'))
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from store.currency import load_rates_file
+
+
+class Command(BaseCommand):
+    help = 'Load exchange rates against BASE_CURRENCY from a JSON file: {"base": "USD", "rates": {"EUR": "0.92"}}.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='Rate file to load; defaults to EXCHANGE_RATES_FILE.')
+
+    def handle(self, *args, **options):
+        path = options['path'] or settings.EXCHANGE_RATES_FILE
+        if not path:
+            raise CommandError('Pass a rate file or set EXCHANGE_RATES_FILE.')
+
+        try:
+            loaded = load_rates_file(path)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f'Loaded {loaded} exchange rates against {settings.BASE_CURRENCY}.'))
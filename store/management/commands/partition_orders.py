@@ -0,0 +1,42 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from store.partitioning import add_months, convert_to_partitioned, create_partitions, is_partitioned, month_start
+
+
+class Command(BaseCommand):
+    help = (
+        'Range-partition the Order table by month on created_at (PostgreSQL only). '
+        'Run with --convert once, then regularly (e.g. monthly from cron) to create upcoming partitions.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convert', action='store_true', help='Rebuild the existing Order table as partitioned.')
+        parser.add_argument(
+            '--months-ahead', type=int, default=3, help='Number of future monthly partitions to keep ready.'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Order partitioning requires PostgreSQL.')
+
+        months_ahead = options['months_ahead']
+        if months_ahead < 0:
+            raise CommandError('--months-ahead must not be negative.')
+
+        if options['convert']:
+            if is_partitioned():
+                raise CommandError('The Order table is already partitioned.')
+            with transaction.atomic():
+                convert_to_partitioned(months_ahead)
+            self.stdout.write(self.style.SUCCESS('Order table converted to monthly partitions.'))
+            return
+
+        if not is_partitioned():
+            raise CommandError('The Order table is not partitioned yet; run with --convert first.')
+
+        this_month = month_start(date.today())
+        create_partitions(this_month, add_months(this_month, months_ahead))
+        self.stdout.write(self.style.SUCCESS(f'Order partitions ready through {add_months(this_month, months_ahead):%Y-%m}.'))
@@ -0,0 +1,129 @@
+import json
+import os
+import re
+import subprocess
+import sys
+from statistics import median
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$')
+TRACKED_PACKAGES = ('store.views', 'store.swagger', 'rest_framework', 'drf_yasg')
+
+
+def in_package(module, package):
+    return module == package or module.startswith(package + '.')
+
+
+def parse_importtime(output, packages):
+    """
+    Parse ``-X importtime`` output into per-module and per-package import times in milliseconds.
+
+    Modules imported through importlib.import_module (settings, INSTALLED_APPS entries) are not reported
+    by the interpreter, so a package's time is the cumulative time of every import of one of its modules
+    made from outside the package, which includes the third-party modules it pulls in.
+    """
+    entries = []
+    for line in output.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            entries.append((module, len(indent) // 2, int(self_us) / 1000, int(cumulative_us) / 1000))
+
+    modules = {}
+    package_ms = dict.fromkeys(packages, 0.0)
+    # The output lists children before their parent; walking it backwards visits parents first
+    ancestors = []
+    for module, depth, self_ms, cumulative_ms in reversed(entries):
+        del ancestors[depth:]
+        parent = ancestors[-1] if ancestors else None
+        ancestors.append(module)
+        modules.setdefault(module, (self_ms, cumulative_ms))
+        for package in packages:
+            if in_package(module, package) and not (parent and in_package(parent, package)):
+                package_ms[package] += cumulative_ms
+    return modules, package_ms
+
+
+class Command(BaseCommand):
+    help = (
+        'Profile cold start: boots the project in fresh interpreters and reports per-module import times, '
+        'app registry readiness and first-request latency as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        # The schema endpoint is public and needs no database rows, so the default request runs a real view
+        parser.add_argument('--url', default='/swagger.json/', help='Path used for the first request.')
+        parser.add_argument('--username', help='Make the requests as this existing user, e.g. for API endpoints.')
+        parser.add_argument('--runs', type=int, default=3, help='Fresh processes to boot; medians are reported.')
+        parser.add_argument('--top', type=int, default=15, help='Number of slowest imports to list.')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout.')
+
+    def handle(self, *args, **options):
+        if options['runs'] < 1:
+            raise CommandError('--runs must be a positive integer.')
+
+        runs = [self.boot(options['url'], options['username']) for _ in range(options['runs'])]
+        report = self.summarize(runs, options['top'])
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as report_file:
+                report_file.write(output + '\n')
+            self.stderr.write(f'Startup report written to {options["output"]}')
+        else:
+            self.stdout.write(output)
+
+    def boot(self, url, username=None):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'unicart.settings')}
+        command = [sys.executable, '-X', 'importtime', '-m', 'store.startup_profile', url]
+        if username:
+            command.append(username)
+        result = subprocess.run(
+            command,
+            capture_output=True,
+            text=True,
+            cwd=settings.BASE_DIR,
+            env=env,
+        )
+        if result.returncode != 0:
+            raise CommandError(f'Startup profile run failed:\n{result.stderr[-2000:]}')
+
+        run = json.loads(result.stdout)
+        run['imports'], run['packages'] = parse_importtime(result.stderr, TRACKED_PACKAGES)
+        return run
+
+    def summarize(self, runs, top):
+        def median_of(values):
+            return round(median(values), 2)
+
+        phases = {name: median_of([run['phases_ms'][name] for run in runs]) for name in runs[0]['phases_ms']}
+
+        imports = {}
+        for module in runs[0]['imports']:
+            timings = [run['imports'][module] for run in runs if module in run['imports']]
+            imports[module] = (median_of([t[0] for t in timings]), median_of([t[1] for t in timings]))
+
+        store_modules = {
+            module: cumulative
+            for module, (_, cumulative) in imports.items()
+            if module == 'store' or module.startswith('store.')
+        }
+        slowest = sorted(imports.items(), key=lambda item: item[1][0], reverse=True)[:top]
+
+        return {
+            'runs': len(runs),
+            'url': runs[0]['url'],
+            'status_code': runs[0]['status_code'],
+            'phases_ms': phases,
+            'modules_ms': {
+                'unicart.settings': phases['settings'],
+                **{package: median_of([run['packages'][package] for run in runs]) for package in TRACKED_PACKAGES},
+            },
+            'store_modules_ms': store_modules,
+            'slowest_imports_ms': [
+                {'module': module, 'self': self_ms, 'cumulative': cumulative}
+                for module, (self_ms, cumulative) in slowest
+            ],
+        }
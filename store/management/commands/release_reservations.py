@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store.services import InventoryService
+
+
+class Command(BaseCommand):
+    help = 'Return the stock held by expired cart reservations; run it periodically, e.g. from cron.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Reservations released per transaction.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be a positive integer.')
+
+        released = InventoryService.release_expired(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Released {released} reserved units.'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store.services import CartService
+
+
+class Command(BaseCommand):
+    help = 'Refresh cart line price snapshots from current catalog prices, e.g. after a price change.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--product', type=int, action='append', dest='product_ids',
+            help='Only reprice lines for this product ID; may be given several times.'
+        )
+        parser.add_argument('--batch-size', type=int, default=500, help='Carts updated per transaction.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be a positive integer.')
+
+        repriced = CartService.reprice_carts(product_ids=options['product_ids'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Repriced {repriced} carts.'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store.models import Product
+from store.services import InventoryService
+
+
+class Command(BaseCommand):
+    help = 'Start tracking a product\'s stock, or replace it, spreading it across INVENTORY_STOCK_STRIPES counters.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('product_id', type=int)
+        parser.add_argument('quantity', type=int, help='Units available for new reservations.')
+
+    def handle(self, *args, **options):
+        if options['quantity'] < 0:
+            raise CommandError('quantity must not be negative.')
+        try:
+            product = Product.objects.get(pk=options['product_id'])
+        except Product.DoesNotExist:
+            raise CommandError(f'Product {options["product_id"]} does not exist.')
+
+        InventoryService.set_stock(product, options['quantity'])
+        self.stdout.write(self.style.SUCCESS(f'{product.name}: {options["quantity"]} units in stock.'))
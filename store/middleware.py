@@ -0,0 +1,52 @@
+from django.conf import settings
+
+from .profiling import PROFILE_HEADER, profile_request
+from .routers import use_primary
+
+PIN_COOKIE_NAME = 'unicart_pin_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaPinningMiddleware:
+    """
+    Pin writes, and the reads that follow them, to the primary database.
+
+    Unsafe requests run entirely on the primary and set a short-lived cookie so the same client keeps
+    reading its own writes from the primary until the replicas have caught up.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        is_write = request.method not in SAFE_METHODS
+        with use_primary(is_write or PIN_COOKIE_NAME in request.COOKIES):
+            response = self.get_response(request)
+
+        if is_write:
+            response.set_cookie(
+                PIN_COOKIE_NAME, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax'
+            )
+        return response
+
+
+class ServiceProfilingMiddleware:
+    """
+    Profile the service calls of requests that send the X-Profile-Services header, for staff users only.
+
+    The names of the profile files written for the request are returned in the X-Service-Profiles header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if PROFILE_HEADER not in request.headers:
+            return self.get_response(request)
+
+        with profile_request(request):
+            response = self.get_response(request)
+
+        if request.service_profiles:
+            response['X-Service-Profiles'] = ', '.join(request.service_profiles)
+        return response
@@ -1,4 +1,8 @@
-from django.db import models
+from datetime import timedelta
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Max
+from django.utils import timezone
 from django.contrib.auth.models import User
 
 class Product(models.Model):
@@ -12,6 +16,8 @@ class CartItem(models.Model):
     cart = models.ForeignKey('Cart', on_delete=models.CASCADE, related_name='items')  
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
+    # Product price when the line was last written; null only on lines written before snapshotting
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, null=True)
     
     def __str__(self):
         return f'{self.product.name} x {self.quantity}'
@@ -19,6 +25,15 @@ class CartItem(models.Model):
 class Cart(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0.0)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # Last activity, drives expiry
+
+    @staticmethod
+    def expiry_cutoff():
+        """Carts not updated since this moment are expired."""
+        return timezone.now() - timedelta(days=settings.CART_EXPIRY_DAYS)
+
+    def is_expired(self):
+        return self.updated_at is not None and self.updated_at < Cart.expiry_cutoff()
     
     def __str__(self):
         return f'Cart for {self.user.username}'
@@ -32,20 +47,129 @@ class CouponCode(models.Model):
     def __str__(self):
         return self.code
 
+def default_currency():
+    return settings.BASE_CURRENCY
+
+class ExchangeRate(models.Model):
+    # Units of this currency per unit of BASE_CURRENCY, the currency of every stored price and total
+    currency = models.CharField(max_length=3, unique=True)
+    rate = models.DecimalField(max_digits=18, decimal_places=8)
+    updated_at = models.DateTimeField(auto_now=True)  # Part of the version that invalidates cached rates
+
+    def __str__(self):
+        return f'1 {settings.BASE_CURRENCY} = {self.rate} {self.currency}'
+
 class Order(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     discount_code = models.ForeignKey(CouponCode, null=True, blank=True, on_delete=models.SET_NULL)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     total_discount_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0.0)
     total_items_purchased = models.PositiveIntegerField(default=0)  
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Enforced by the database only while the table is unpartitioned; a partitioned table can only be unique
+    # per (order_number, created_at), so OrderNumber is what keeps numbers globally unique
     order_number = models.PositiveIntegerField(unique=True)
+    # total_amount and total_discount_amount are in BASE_CURRENCY; the customer paid in this currency at this rate
+    paid_currency = models.CharField(max_length=3, default=default_currency)
+    paid_exchange_rate = models.DecimalField(max_digits=18, decimal_places=8, default=1)
 
     def save(self, *args, **kwargs):
         if not self.order_number:
-            last_order = Order.objects.order_by('-order_number').first()
-            self.order_number = 1 if not last_order else last_order.order_number + 1
+            self.order_number = OrderNumber.allocate()
         super().save(*args, **kwargs)
 
     def __str__(self):
         return f'Order #{self.order_number} for {self.user.username}'
+
+class OrderNumber(models.Model):
+    # A single row holding the last order number issued, in an unpartitioned table. Numbers are taken under
+    # its row lock, so they stay globally unique where a partitioned Order table cannot enforce it and are
+    # never reused once their orders are archived
+    last_number = models.PositiveIntegerField(default=0)
+
+    COUNTER_PK = 1
+
+    @classmethod
+    def allocate(cls):
+        """
+        Claim the next order number.
+
+        The counter row stays locked until the caller's transaction ends, so concurrent checkouts take
+        numbers one after another rather than colliding, and a rolled-back checkout leaves no gap.
+        """
+        with transaction.atomic():
+            counter, _ = cls.objects.select_for_update().get_or_create(
+                pk=cls.COUNTER_PK, defaults={'last_number': cls.last_issued_number}
+            )
+            counter.last_number += 1
+            counter.save(update_fields=['last_number'])
+        return counter.last_number
+
+    @staticmethod
+    def last_issued_number():
+        # Orders placed before the counter existed, possibly all archived already
+        return max(
+            Order.objects.aggregate(Max('order_number'))['order_number__max'] or 0,
+            ArchivedOrderPeriod.objects.aggregate(Max('max_order_number'))['max_order_number__max'] or 0,
+        )
+
+    def __str__(self):
+        return f'Last order number {self.last_number}'
+
+class UserOrderCounter(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='order_counter')
+    order_count = models.PositiveIntegerField(default=0)  # Number of orders the user has placed
+
+    def __str__(self):
+        return f'{self.user.username}: {self.order_count} orders'
+
+class ArchivedOrderPeriod(models.Model):
+    period_start = models.DateField(unique=True)  # First day of the archived month
+    order_count = models.PositiveIntegerField(default=0)
+    max_order_number = models.PositiveIntegerField(default=0)
+    location = models.CharField(max_length=255)  # Archive table name or file path
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'Orders {self.period_start:%Y-%m} archived to {self.location}'
+
+class StockStripe(models.Model):
+    # A product's stock is split across several stripes so concurrent buyers update different rows
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_stripes')
+    stripe = models.PositiveSmallIntegerField()
+    available = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('product', 'stripe')
+
+    def __str__(self):
+        return f'{self.product.name} stripe {self.stripe}: {self.available}'
+
+class StockReservation(models.Model):
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='stock_reservations')
+    stock_stripe = models.ForeignKey(StockStripe, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f'{self.quantity} x {self.stock_stripe.product.name} for cart {self.cart_id}'
+
+class CartEvent(models.Model):
+    # Append-only cart changes; folded into Cart/CartItem on read, at checkout and by compact_cart_events
+    ADD = 'add'
+    SET = 'set'
+    REMOVE = 'remove'
+    ACTION_CHOICES = [(ADD, 'Add'), (SET, 'Set quantity'), (REMOVE, 'Remove')]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='cart_events')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    action = models.CharField(max_length=6, choices=ACTION_CHOICES)
+    quantity = models.PositiveIntegerField(default=0)
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)  # Product price when the event was written
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'id'])]
+
+    def __str__(self):
+        return f'{self.action} {self.quantity} x product {self.product_id} for user {self.user_id}'
@@ -0,0 +1,145 @@
+"""
+Monthly range partitioning of the Order table on ``created_at`` (PostgreSQL only).
+
+Partitions are named ``<table>_pYYYYMM`` and cover one calendar month each. A DEFAULT partition catches
+rows outside the pre-created range so inserts never fail.
+"""
+from datetime import date
+
+from django.db import connection
+
+from .models import Order
+
+ORDER_TABLE = Order._meta.db_table
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(value, months):
+    month_index = value.year * 12 + value.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def partition_name(start):
+    return f'{ORDER_TABLE}_p{start:%Y%m}'
+
+
+def archive_table_name(start):
+    return f'{ORDER_TABLE}_archive_{start:%Y%m}'
+
+
+def is_partitioned():
+    """
+    Return True if the Order table is a PostgreSQL partitioned table.
+    """
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)',
+            [ORDER_TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions():
+    """
+    Return the month starts of all monthly partitions currently attached to the Order table.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s
+            """,
+            [ORDER_TABLE],
+        )
+        prefix = f'{ORDER_TABLE}_p'
+        return sorted(
+            date(int(name[-6:-2]), int(name[-2:]), 1)
+            for (name,) in cursor.fetchall()
+            if name.startswith(prefix) and name[len(prefix):].isdigit()
+        )
+
+
+def create_partitions(first_month, last_month):
+    """
+    Create the monthly partitions from first_month to last_month (inclusive) that do not exist yet.
+    """
+    quote = connection.ops.quote_name
+    start = month_start(first_month)
+    with connection.cursor() as cursor:
+        while start <= last_month:
+            end = add_months(start, 1)
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {quote(partition_name(start))} PARTITION OF {quote(ORDER_TABLE)} '
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            )
+            start = end
+
+
+def convert_to_partitioned(months_ahead):
+    """
+    Rebuild the Order table as a table range-partitioned by month on created_at.
+
+    PostgreSQL requires the partition key in every unique constraint, so the primary key becomes
+    (id, created_at) and the table can only keep order_number unique per created_at. Global uniqueness
+    comes from the unpartitioned OrderNumber counter that numbers are taken from. Must run inside a
+    transaction.
+    """
+    quote = connection.ops.quote_name
+    table = quote(ORDER_TABLE)
+    old_table = quote(f'{ORDER_TABLE}_unpartitioned')
+    user_table = quote(Order._meta.get_field('user').related_model._meta.db_table)
+    coupon_table = quote(Order._meta.get_field('discount_code').related_model._meta.db_table)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT min(created_at) FROM {table}')
+        oldest = cursor.fetchone()[0]
+
+        cursor.execute(f'ALTER TABLE {table} RENAME TO {old_table}')
+        cursor.execute(
+            f'CREATE TABLE {table} (LIKE {old_table} INCLUDING DEFAULTS INCLUDING IDENTITY) '
+            'PARTITION BY RANGE (created_at)'
+        )
+        cursor.execute(f'ALTER TABLE {table} ADD PRIMARY KEY (id, created_at)')
+        cursor.execute(f'ALTER TABLE {table} ADD UNIQUE (order_number, created_at)')
+        cursor.execute(f'CREATE INDEX ON {table} (created_at)')
+        cursor.execute(f'CREATE INDEX ON {table} (user_id)')
+        cursor.execute(f'CREATE INDEX ON {table} (discount_code_id)')
+        cursor.execute(
+            f'ALTER TABLE {table} ADD FOREIGN KEY (user_id) REFERENCES {user_table} (id) '
+            'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED'
+        )
+        cursor.execute(
+            f'ALTER TABLE {table} ADD FOREIGN KEY (discount_code_id) REFERENCES {coupon_table} (id) '
+            'ON DELETE SET NULL DEFERRABLE INITIALLY DEFERRED'
+        )
+        cursor.execute(f'CREATE TABLE {quote(ORDER_TABLE + "_default")} PARTITION OF {table} DEFAULT')
+
+        this_month = month_start(date.today())
+        create_partitions(oldest or this_month, add_months(this_month, months_ahead))
+
+        cursor.execute(f'INSERT INTO {table} SELECT * FROM {old_table}')
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence('{ORDER_TABLE}', 'id'), COALESCE(max(id), 0) + 1, false) "
+            f'FROM {table}'
+        )
+        cursor.execute(f'DROP TABLE {old_table}')
+
+
+def detach_partition(start):
+    """
+    Detach a monthly partition and keep it as a standalone archive table.
+    """
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {quote(ORDER_TABLE)} DETACH PARTITION {quote(partition_name(start))}')
+        cursor.execute(
+            f'ALTER TABLE {quote(partition_name(start))} RENAME TO {quote(archive_table_name(start))}'
+        )
@@ -0,0 +1,223 @@
+import functools
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile-Services'
+PROFILE_FILE_SUFFIXES = {'pstats': '.prof', 'collapsed': '.collapsed'}
+
+# The HttpRequest whose client asked for profiles, and whether a profiled service call is running
+_profile_request = ContextVar('profile_request', default=None)
+_profiling = ContextVar('profiling', default=False)
+
+# Since Python 3.12 cProfile hooks the interpreter-wide sys.monitoring, so only one profile can be
+# recorded per process at a time; calls arriving while another thread is profiling run unprofiled
+_profiler_lock = threading.Lock()
+
+
+@contextmanager
+def profile_request(request):
+    """
+    Profile the service calls made in the block if the request's user turns out to be staff.
+
+    The user is checked when a service is called rather than here, because DRF authenticates inside the
+    view. Files written for the request are collected in request.service_profiles.
+    """
+    request.service_profiles = []
+    token = _profile_request.set(request)
+    try:
+        yield
+    finally:
+        _profile_request.reset(token)
+
+
+def profile_trigger():
+    """
+    Return why the current service call should be profiled ('header' or 'sample'), or None.
+    """
+    request = _profile_request.get()
+    if request is not None and getattr(request.user, 'is_staff', False):
+        return 'header'
+    if settings.SERVICE_PROFILE_SAMPLE_RATE and random.random() < settings.SERVICE_PROFILE_SAMPLE_RATE:
+        return 'sample'
+    return None
+
+
+def profiled(name, func):
+    """
+    Wrap a service function so opted-in calls run under cProfile and leave a profile file behind.
+
+    Only the outermost profiled call of a request is profiled; services calling each other show up in its
+    profile. With SERVICE_PROFILE_DIR unset, or while another call is being profiled, the wrapper just calls
+    through.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not settings.SERVICE_PROFILE_DIR or _profiling.get():
+            return func(*args, **kwargs)
+        trigger = profile_trigger()
+        if trigger is None:
+            return func(*args, **kwargs)
+
+        if not _profiler_lock.acquire(blocking=False):
+            return func(*args, **kwargs)
+        try:
+            profile = start_profile()
+            if profile is None:
+                return func(*args, **kwargs)
+            token = _profiling.set(True)
+            started = time.time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.disable()
+                _profiling.reset(token)
+                save_profile(profile, name, trigger, started)
+        finally:
+            _profiler_lock.release()
+
+    return wrapper
+
+
+def start_profile():
+    """
+    Return an enabled cProfile.Profile, or None if another profiling tool (a debugger, coverage, ...)
+    already owns the interpreter's profiling hooks.
+    """
+    # Imported here rather than at the top so workers that never profile do not load it at boot
+    import cProfile
+
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        return None
+    return profile
+
+
+def save_profile(profile, name, trigger, started):
+    try:
+        path = write_profile(profile, name, trigger, started)
+    except Exception:
+        # Runs in the wrapper's finally block: a full profile directory or a bad setting must not fail the call
+        logger.exception('Could not write the profile of %s', name)
+        return
+    request = _profile_request.get()
+    if request is not None and trigger == 'header':
+        request.service_profiles.append(path.name)
+
+
+def profile_services(*service_classes):
+    """
+    Wrap every public static method of the given service classes with profiled().
+    """
+    for service_class in service_classes:
+        for attr, value in list(vars(service_class).items()):
+            if isinstance(value, staticmethod) and not attr.startswith('_'):
+                name = f'{service_class.__name__}.{attr}'
+                setattr(service_class, attr, staticmethod(profiled(name, value.__func__)))
+
+
+def check_profile_settings():
+    """
+    Raise ImproperlyConfigured for an unknown SERVICE_PROFILE_FORMAT; called once at startup.
+    """
+    if settings.SERVICE_PROFILE_FORMAT not in PROFILE_FILE_SUFFIXES:
+        raise ImproperlyConfigured(f"SERVICE_PROFILE_FORMAT must be one of {', '.join(PROFILE_FILE_SUFFIXES)}.")
+
+
+def write_profile(profile, name, trigger, started):
+    """
+    Write a profile in SERVICE_PROFILE_FORMAT to SERVICE_PROFILE_DIR and rotate the directory.
+    """
+    import pstats
+
+    check_profile_settings()
+    directory = Path(settings.SERVICE_PROFILE_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    output_format = settings.SERVICE_PROFILE_FORMAT
+    stamp = time.strftime('%Y%m%dT%H%M%S', time.gmtime(started))
+    path = directory / f'{stamp}-{int(started * 1e6) % 1000000:06d}-{name}-{trigger}-{os.getpid()}'
+    path = path.with_name(path.name + PROFILE_FILE_SUFFIXES[output_format])
+
+    if output_format == 'collapsed':
+        stacks = collapsed_stacks(pstats.Stats(profile))
+        path.write_text(''.join(f'{stack} {micros}\n' for stack, micros in sorted(stacks.items())))
+    else:
+        profile.dump_stats(path)
+
+    rotate_profiles(directory, settings.SERVICE_PROFILE_MAX_BYTES)
+    return path
+
+
+def rotate_profiles(directory, max_bytes):
+    """
+    Delete the oldest profile files until the directory holds at most max_bytes of them.
+    """
+    profiles = []
+    for suffix in PROFILE_FILE_SUFFIXES.values():
+        for path in directory.glob(f'*{suffix}'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:  # Removed by another process rotating the same directory
+                continue
+            profiles.append((stat.st_mtime, path.name, stat.st_size, path))
+
+    total = sum(size for _, _, size, _ in profiles)
+    for _, _, size, path in sorted(profiles):
+        if total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+
+
+def frame_label(func):
+    filename, line, name = func
+    if filename == '~':  # Built-ins have no source location
+        return name.replace(';', ':')
+    return f'{name} ({os.path.basename(filename)}:{line})'.replace(';', ':')
+
+
+def collapsed_stacks(stats):
+    """
+    Turn cProfile statistics into flamegraph.pl / speedscope collapsed stacks with microsecond weights.
+
+    cProfile records caller-callee pairs, not whole stacks, so a function's time is split across its
+    callers in proportion to the time each caller spent in it.
+    """
+    callees = defaultdict(dict)
+    for func, (_, _, _, _, callers) in stats.stats.items():
+        for caller, edge in callers.items():
+            callees[caller][func] = edge
+
+    stacks = Counter()
+
+    def walk(func, stack, share, seen):
+        _, _, self_time, total_time, _ = stats.stats[func]
+        if total_time * share < 1e-6:
+            return  # Too little time on this path to show up; also keeps large call graphs tractable
+        frames = stack + (frame_label(func),)
+        micros = round(self_time * share * 1e6)
+        if micros:
+            stacks[';'.join(frames)] += micros
+        for callee, (_, _, _, edge_time) in callees[func].items():
+            callee_total = stats.stats[callee][3]
+            # Recursive calls are folded into the outermost frame of the function
+            if callee not in seen and callee_total:
+                walk(callee, frames, share * edge_time / callee_total, seen | {callee})
+
+    for func, (_, _, _, _, callers) in stats.stats.items():
+        if not callers:
+            walk(func, (), 1.0, {func})
+    return stacks
@@ -0,0 +1,68 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+# Models whose reads are safe to serve from a replica: the catalog, coupon listings and order reports.
+# Carts are read-modify-write on every request and always stay on the primary.
+REPLICA_READ_MODELS = {'product', 'couponcode', 'order'}
+
+# None outside any use_primary() scope, so writes made by management commands, the shell or workers
+# do not pin the rest of the process to the primary
+_pinned_to_primary = ContextVar('pinned_to_primary', default=None)
+
+
+def pin_to_primary():
+    """
+    Route the remaining reads of the current use_primary() scope to the primary database.
+
+    Outside a scope this does nothing; wrap read-modify-write code in use_primary() instead.
+    """
+    if _pinned_to_primary.get() is not None:
+        _pinned_to_primary.set(True)
+
+
+def is_pinned_to_primary():
+    return bool(_pinned_to_primary.get())
+
+
+@contextmanager
+def use_primary(pinned=True):
+    """
+    Send every read in the block to the primary (or, with pinned=False, let reads use the replicas),
+    e.g. for read-modify-write code outside a request. Pinning caused by writes in the block ends with it.
+    """
+    token = _pinned_to_primary.set(pinned)
+    try:
+        yield
+    finally:
+        _pinned_to_primary.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Send catalog, listing and report reads to the configured replicas and everything else to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+        # Reads inside a transaction usually feed its writes and must not see lagging data
+        if not replicas or is_pinned_to_primary() or connections['default'].in_atomic_block:
+            return 'default'
+        if model._meta.app_label != 'store' or model._meta.model_name not in REPLICA_READ_MODELS:
+            return 'default'
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        # Reads that follow a write in the same request or use_primary() block must see it.
+        pin_to_primary()
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas mirror the primary, so objects from any alias may be related.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
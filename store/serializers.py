@@ -1,5 +1,11 @@
+from decimal import Decimal
+from django.utils import timezone
 from rest_framework import serializers
 from .models import Product, CartItem, Cart, CouponCode, Order
+from .currency import convert_amount
+
+TWO_PLACES = Decimal('0.01')
+RATE_PLACES = Decimal('0.00000001')
 
 class ProductSerializer(serializers.ModelSerializer):
     class Meta:
@@ -11,7 +17,7 @@ class CartItemSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = CartItem
-        fields = ['product', 'quantity']
+        fields = ['product', 'quantity', 'unit_price']
 
 class CartSerializer(serializers.ModelSerializer):
     items = CartItemSerializer(many=True)
@@ -29,6 +35,7 @@ class OrderSerializer(serializers.ModelSerializer):
     discount_code = CouponCodeSerializer()  # Serialize the discount code
     total_items_purchased = serializers.IntegerField()  # Include total items purchased
     total_discount_amount = serializers.DecimalField(max_digits=10, decimal_places=2)  # Include total discount amount
+    paid_total_amount = serializers.SerializerMethodField()  # What the customer was charged, in paid_currency
 
     class Meta:
         model = Order
@@ -39,5 +46,107 @@ class OrderSerializer(serializers.ModelSerializer):
             'total_discount_amount',
             'total_items_purchased',
             'created_at',
-            'order_number'
+            'order_number',
+            'paid_currency',
+            'paid_exchange_rate',
+            'paid_total_amount'
         ]
+
+    def get_paid_total_amount(self, instance):
+        return flat_decimal(convert_amount(instance.total_amount, instance.paid_exchange_rate))
+
+def flat_decimal(value, places=TWO_PLACES):
+    """
+    Format a two-place (or `places`) decimal model value the way DecimalField(decimal_places=2) does.
+    """
+    if value is None:
+        return None
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value).strip())
+    return str(value.quantize(places))
+
+def flat_datetime(value):
+    """
+    Format a datetime the way DRF's DateTimeField does with the default ISO 8601 setting.
+    """
+    if value is None:
+        return None
+    if timezone.is_aware(value):
+        value = timezone.localtime(value)
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+class FlatSerializer(serializers.BaseSerializer):
+    """
+    Read-only serializer that builds its representation straight from model attributes.
+
+    Unlike ModelSerializer it does no per-field introspection or field binding, which makes it much
+    cheaper on high-volume responses. Output matches the corresponding ModelSerializer.
+    """
+
+class FlatCouponCodeSerializer(FlatSerializer):
+    def to_representation(self, instance):
+        return {
+            'code': instance.code,
+            'discount_percentage': flat_decimal(instance.discount_percentage),
+            'is_used': instance.is_used,
+            'order_n': instance.order_n,
+        }
+
+class FlatOrderSerializer(FlatSerializer):
+    coupon_code_serializer = FlatCouponCodeSerializer()
+
+    def to_representation(self, instance):
+        discount_code = instance.discount_code
+        return {
+            'user': instance.user_id,
+            'discount_code': self.coupon_code_serializer.to_representation(discount_code) if discount_code else None,
+            'total_amount': flat_decimal(instance.total_amount),
+            'total_discount_amount': flat_decimal(instance.total_discount_amount),
+            'total_items_purchased': instance.total_items_purchased,
+            'created_at': flat_datetime(instance.created_at),
+            'order_number': instance.order_number,
+            'paid_currency': instance.paid_currency,
+            'paid_exchange_rate': flat_decimal(instance.paid_exchange_rate, RATE_PLACES),
+            'paid_total_amount': flat_decimal(convert_amount(instance.total_amount, instance.paid_exchange_rate)),
+        }
+
+class FlatCartSerializer(FlatSerializer):
+    """
+    Pass context={'currency': ..., 'exchange_rate': ...} to show every amount of the cart in that currency.
+    """
+
+    def to_representation(self, instance):
+        if 'items' in getattr(instance, '_prefetched_objects_cache', {}):
+            items = instance.items.all()
+        else:
+            items = instance.items.select_related('product')
+
+        rate = self.context.get('exchange_rate')
+        if rate is None:
+            amount = flat_decimal
+        else:
+            def amount(value):
+                return flat_decimal(convert_amount(value, rate))
+
+        data = {
+            'user': instance.user_id,
+            'items': [
+                {
+                    'product': {
+                        'id': item.product.id,
+                        'name': item.product.name,
+                        'price': amount(item.product.price),
+                    },
+                    'quantity': item.quantity,
+                    'unit_price': amount(item.unit_price),
+                }
+                for item in items
+            ],
+            'total_amount': amount(instance.total_amount),
+        }
+        if rate is not None:
+            data['currency'] = self.context['currency']
+        return data
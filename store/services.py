@@ -1,14 +1,41 @@
-from django.db.models import Sum
-from .models import Cart, Product, CartItem, Order, CouponCode
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import Cart, Product, CartItem, Order, CouponCode, UserOrderCounter, StockStripe, StockReservation, CartEvent
+from .currency import convert_amount, convert_rows, get_rate, normalize_currency, round_amount
+from .profiling import profile_services
+from .routers import use_primary
 import random
 import string
 
+# Line total from the price snapshot, so cart and order totals never need the Product table
+LINE_TOTAL = ExpressionWrapper(F('unit_price') * F('quantity'), output_field=DecimalField(max_digits=10, decimal_places=2))
+
+# Order amounts in the currency the customer paid in
+LOCAL_AMOUNT = DecimalField(max_digits=30, decimal_places=10)
+LOCAL_PURCHASE = ExpressionWrapper(F('total_amount') * F('paid_exchange_rate'), output_field=LOCAL_AMOUNT)
+LOCAL_DISCOUNT = ExpressionWrapper(F('total_discount_amount') * F('paid_exchange_rate'), output_field=LOCAL_AMOUNT)
+
 
 class CartService:
     @staticmethod
+    @transaction.atomic
     def add_items_to_cart(user, products):
-        cart, _ = Cart.objects.get_or_create(user=user)
+        # Apply changes recorded through the event log first so they keep their order
+        CartService.apply_cart_events(user)
+
+        cart, created = Cart.objects.get_or_create(user=user)
+        if not created and cart.is_expired():
+            # Start over instead of reviving an abandoned cart that has not been cleaned up yet
+            InventoryService.release(cart.stock_reservations.all())
+            cart.items.all().delete()
 
+        lines = []
         for product_data in products:
             product_id = product_data.get('product_id')
             quantity = product_data.get('quantity', 1)
@@ -16,48 +43,246 @@ class CartService:
             if not product_id or not isinstance(quantity, int) or quantity < 1:
                 raise ValueError("Each product must have a valid product_id and a positive quantity.")
 
-            product = Product.objects.get(id=product_id)
+            lines.append((Product.objects.get(id=product_id), quantity))
+
+        # Reserve in product order so two carts adding the same products cannot deadlock on stock stripes
+        for product, quantity in sorted(lines, key=lambda line: line[0].pk):
+            InventoryService.reserve(cart, product.pk, quantity)
             cart_item, created = CartItem.objects.get_or_create(
                 cart=cart,
                 product=product,
-                defaults={'quantity': quantity}
+                defaults={'quantity': quantity, 'unit_price': product.price}
             )
             if not created:
                 cart_item.quantity += quantity
+                cart_item.unit_price = product.price
                 cart_item.save()
 
-        # Recalculate total amount
-        cart.total_amount = sum(item.product.price * item.quantity for item in cart.items.all())
+        InventoryService.extend_reservations(cart)
+
+        # Recalculate total amount from the line snapshots
+        cart.total_amount = cart.items.aggregate(total=Sum(LINE_TOTAL))['total'] or 0
+        cart.save()
+        return cart
+
+    @staticmethod
+    def record_cart_events(user, events):
+        """
+        Append cart changes to the user's event log without touching the cart.
+
+        Only the products' prices are read, without locks, and all events are written with one INSERT, so
+        concurrent writers for the same cart never wait on each other. The changes show up in the cart
+        the next time its events are applied.
+
+        Args:
+            user: The user whose cart changes.
+            events: Dicts with product_id, action ('add', 'set' or 'remove') and quantity.
+
+        Returns:
+            list[CartEvent]: The recorded events.
+
+        Raises:
+            ValueError: If an event is malformed.
+            Product.DoesNotExist: If a product does not exist.
+        """
+        actions = {action for action, _ in CartEvent.ACTION_CHOICES}
+        for event in events:
+            if not isinstance(event, dict):
+                raise ValueError("Each event must be an object.")
+            action = event.get('action')
+            quantity = event.get('quantity', 0 if action == CartEvent.REMOVE else 1)
+            if action not in actions:
+                raise ValueError(f"Event action must be one of {', '.join(sorted(actions))}.")
+            product_id = event.get('product_id')
+            valid_product_id = isinstance(product_id, int) and not isinstance(product_id, bool) and product_id > 0
+            if not valid_product_id or not isinstance(quantity, int) or quantity < 0:
+                raise ValueError("Each event must have a valid product_id and a non-negative quantity.")
+            if action == CartEvent.ADD and quantity < 1:
+                raise ValueError("Add events need a positive quantity.")
+
+        # The events snapshot these prices, so they must not come from a lagging replica
+        with use_primary():
+            prices = dict(Product.objects.filter(id__in={e['product_id'] for e in events}).values_list('id', 'price'))
+        missing = {e['product_id'] for e in events} - prices.keys()
+        if missing:
+            raise Product.DoesNotExist(f"Product {min(missing)} does not exist.")
+
+        return CartEvent.objects.bulk_create(
+            CartEvent(
+                user=user,
+                product_id=event['product_id'],
+                action=event['action'],
+                quantity=0 if event['action'] == CartEvent.REMOVE else event.get('quantity', 1),
+                unit_price=prices[event['product_id']],
+            )
+            for event in events
+        )
+
+    @staticmethod
+    @transaction.atomic
+    def apply_cart_events(user):
+        """
+        Fold the user's pending cart events into their cart and delete the applied events.
+
+        Returns:
+            Cart: The up-to-date cart, or None if the user has neither a cart nor pending events.
+        """
+        if not CartEvent.objects.filter(user=user).exists():
+            return Cart.objects.filter(user=user).first()
+
+        # Lock the cart so concurrent folds apply every event exactly once
+        cart_id = Cart.objects.get_or_create(user=user)[0].pk
+        cart = Cart.objects.select_for_update().get(pk=cart_id)
+        events = list(CartEvent.objects.filter(user=user).order_by('pk'))
+        if not events:
+            return cart
+
+        # Event writes do not touch the cart, so it was abandoned only if it sat idle before the first event
+        if cart.updated_at < events[0].created_at - timedelta(days=settings.CART_EXPIRY_DAYS):
+            InventoryService.release(cart.stock_reservations.all())
+            cart.items.all().delete()
+
+        items = {item.product_id: item for item in cart.items.all()}
+        original = {product_id: item.quantity for product_id, item in items.items()}
+        for event in events:
+            item = items.setdefault(event.product_id, CartItem(cart=cart, product_id=event.product_id, quantity=0))
+            if event.action == CartEvent.ADD:
+                item.quantity += event.quantity
+            elif event.action == CartEvent.SET:
+                item.quantity = event.quantity
+            else:
+                item.quantity = 0
+            item.unit_price = event.unit_price
+
+        emptied = [item.pk for item in items.values() if item.pk and not item.quantity]
+        CartItem.objects.filter(pk__in=emptied).delete()
+        CartItem.objects.bulk_update([item for item in items.values() if item.pk and item.quantity], ['quantity', 'unit_price'])
+        CartItem.objects.bulk_create([item for item in items.values() if not item.pk and item.quantity])
+
+        # Settle stock in product id order, like add_items_to_cart: lowered lines give their reservations back
+        # and hold the new quantity, raised lines hold the difference. The events were accepted without a stock
+        # check, so a line that cannot be covered stays unreserved and checkout rejects it if stock is still short
+        for product_id in sorted(items):
+            quantity, held = items[product_id].quantity, original.get(product_id, 0)
+            if quantity < held:
+                InventoryService.release(cart.stock_reservations.filter(stock_stripe__product_id=product_id))
+                held = 0
+            if quantity > held:
+                try:
+                    InventoryService.reserve(cart, product_id, quantity - held)
+                except ValueError:
+                    pass
+
+        CartEvent.objects.filter(pk__in=[event.pk for event in events]).delete()
+
+        cart.total_amount = cart.items.aggregate(total=Sum(LINE_TOTAL))['total'] or 0
         cart.save()
         return cart
 
+    @staticmethod
+    def reprice_carts(cart_ids=None, product_ids=None, batch_size=500):
+        """
+        Refresh cart line price snapshots from the current catalog prices and recompute cart totals.
+
+        Args:
+            cart_ids: Optional carts to reprice; defaults to every cart.
+            product_ids: Optional products whose price changed; only lines for these products are repriced.
+            batch_size: Number of carts updated per transaction.
+
+        Returns:
+            int: The number of carts repriced.
+        """
+        carts = Cart.objects.order_by('pk')
+        if cart_ids is not None:
+            carts = carts.filter(pk__in=cart_ids)
+        if product_ids is not None:
+            carts = carts.filter(items__product_id__in=product_ids).distinct()
+
+        current_price = Product.objects.filter(pk=OuterRef('product_id')).values('price')[:1]
+        cart_total = (
+            CartItem.objects.filter(cart=OuterRef('pk'))
+            .values('cart')
+            .annotate(total=Sum(LINE_TOTAL))
+            .values('total')
+        )
+
+        repriced = 0
+        last_pk = 0
+        while True:
+            batch = list(carts.filter(pk__gt=last_pk).values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                return repriced
+
+            with transaction.atomic():
+                items = CartItem.objects.filter(cart_id__in=batch)
+                if product_ids is not None:
+                    items = items.filter(product_id__in=product_ids)
+                items.update(unit_price=Subquery(current_price))
+                # update() leaves updated_at alone: repricing is not customer activity
+                Cart.objects.filter(pk__in=batch).update(total_amount=Coalesce(Subquery(cart_total), Value(Decimal('0.00'))))
+
+            repriced += len(batch)
+            last_pk = batch[-1]
+
 
 class OrderService:
     @staticmethod
-    def checkout_cart(user, coupon_code=None):
+    def lock_order_counter(user):
+        """
+        Fetch and row-lock the user's order counter, creating it from their existing orders if missing.
+
+        Must be called inside a transaction; concurrent checkouts by the same user wait on the lock.
+        """
+        counter, _ = UserOrderCounter.objects.select_for_update().get_or_create(
+            user=user,
+            defaults={'order_count': lambda: Order.objects.filter(user=user).count()}
+        )
+        return counter
+
+    @staticmethod
+    @transaction.atomic
+    def checkout_cart(user, coupon_code=None, currency=None):
         """
         Checkout the user's cart and create an order.
 
         Args:
             user: The user performing the checkout.
             coupon_code: Optional discount coupon code.
+            currency: Optional currency the customer pays in; amounts are still stored in BASE_CURRENCY.
 
         Returns:
             Order: The created order instance.
 
         Raises:
-            ValueError: If the cart is empty or the coupon code is invalid.
+            ValueError: If the cart is empty, the coupon code is invalid, an item is out of stock or the
+                currency is not supported.
             Cart.DoesNotExist: If the cart does not exist for the user.
             CouponCode.DoesNotExist: If the coupon code does not exist or is already used.
         """
+        exchange_rate = get_rate(currency)
+
+        # Lock the user's order counter first so concurrent checkouts by the same user run one at a time
+        order_counter = OrderService.lock_order_counter(user)
+        next_order_number = order_counter.order_count + 1
+
+        CartService.apply_cart_events(user)
+
         # Fetch the user's cart
         try:
             cart = Cart.objects.get(user=user)
         except Cart.DoesNotExist:
             raise ValueError("Cart not found.")
 
-        if not cart.items.exists():
+        if cart.is_expired():
+            raise ValueError("Cart has expired.")
+
+        # Totals come from the line snapshots in one aggregate; lines written before snapshotting are repriced first
+        if cart.items.filter(unit_price__isnull=True).exists():
+            CartService.reprice_carts(cart_ids=[cart.pk])
+        totals = cart.items.aggregate(total_amount=Sum(LINE_TOTAL), total_items=Sum('quantity'))
+        if not totals['total_items']:
             raise ValueError("Cart is empty.")
+        cart.total_amount = totals['total_amount']
 
         discount_code = None
         discount_amount = 0
@@ -65,22 +290,21 @@ class OrderService:
         # Validate and apply the coupon code if provided
         if coupon_code:
             try:
-                discount_code = CouponCode.objects.get(code=coupon_code, is_used=False)
+                discount_code = CouponCode.objects.select_for_update().get(code=coupon_code, is_used=False)
             except CouponCode.DoesNotExist:
                 raise ValueError("Invalid or used coupon code.")
 
             # Check if the coupon code is valid for the next order
-            last_order = Order.objects.filter(user=user).order_by('-order_number').first()
-            next_order_number = 1 if not last_order else last_order.order_number + 1
-
             if discount_code.order_n and next_order_number == discount_code.order_n:
                 discount_amount = cart.total_amount * (discount_code.discount_percentage / 100)
                 cart.total_amount -= discount_amount
             else:
                 raise ValueError(f"Coupon code is not valid for order #{next_order_number}.")
 
-        # Calculate total items purchased
-        total_items_purchased = cart.items.aggregate(total_items=Sum('quantity'))['total_items'] or 0
+        total_items_purchased = totals['total_items']
+
+        # The reserved stock becomes sold stock
+        InventoryService.convert_cart_reservations(cart)
 
         # Create the order
         order = Order.objects.create(
@@ -88,9 +312,14 @@ class OrderService:
             discount_code=discount_code,
             total_amount=cart.total_amount,
             total_discount_amount=discount_amount,
-            total_items_purchased=total_items_purchased
+            total_items_purchased=total_items_purchased,
+            paid_currency=normalize_currency(currency),
+            paid_exchange_rate=exchange_rate
         )
 
+        order_counter.order_count = next_order_number
+        order_counter.save(update_fields=['order_count'])
+
         # Mark the coupon code as used
         if discount_code:
             discount_code.is_used = True
@@ -102,27 +331,92 @@ class OrderService:
         return order
 
     @staticmethod
-    def generate_report():
+    def generate_report(start=None, end=None, currency=None):
+        """
+        Build the sales report, optionally limited to orders created in [start, end).
+
+        Bounding the range on created_at lets PostgreSQL prune the order partitions outside it, so
+        recent-data reports only touch the hot partitions.
+
+        Args:
+            start: Optional inclusive lower bound on the order creation time.
+            end: Optional exclusive upper bound on the order creation time.
+            currency: Optional currency to show the order and summary amounts in (default: BASE_CURRENCY).
+
+        Returns:
+            dict: The per-order details, the summary totals and the totals per currency paid in.
+
+        Raises:
+            ValueError: If the currency is not supported.
+        """
+        rate = get_rate(currency)
         orders = Order.objects.all()
+        if start:
+            orders = orders.filter(created_at__gte=start)
+        if end:
+            orders = orders.filter(created_at__lt=end)
+        # Read plain rows with the user and coupon joined in rather than loading each order and its relations
+        rows = orders.order_by('order_number').values_list(
+            'order_number',
+            'user__username',
+            'total_items_purchased',
+            'total_amount',
+            'discount_code__code',
+            'total_discount_amount'
+        )
         order_details = [
             {
-                "order_number": order.order_number,
-                "user": order.user.username,
-                "total_items_purchased": order.total_items_purchased,
-                "total_purchase_amount": order.total_amount,
-                "discount_code": order.discount_code.code if order.discount_code else None,
-                "discount_amount": order.total_discount_amount
+                "order_number": order_number,
+                "user": username,
+                "total_items_purchased": total_items_purchased,
+                "total_purchase_amount": total_amount,
+                "discount_code": discount_code,
+                "discount_amount": total_discount_amount
             }
-            for order in orders
+            for order_number, username, total_items_purchased, total_amount, discount_code, total_discount_amount in rows
         ]
 
+        # One aggregate query so the order partitions are scanned once for all totals
+        totals = orders.aggregate(
+            total_items=Sum('total_items_purchased'),
+            total_purchase=Sum('total_amount'),
+            total_discount=Sum('total_discount_amount')
+        )
         summary = {
-            "total_items_purchased": orders.aggregate(total_items=Sum('total_items_purchased'))['total_items'] or 0,
-            "total_purchase_amount": orders.aggregate(total_purchase=Sum('total_amount'))['total_purchase'] or 0,
-            "total_discount_amount": orders.aggregate(total_discount=Sum('total_discount_amount'))['total_discount'] or 0
+            "total_items_purchased": totals['total_items'] or 0,
+            "total_purchase_amount": totals['total_purchase'] or 0,
+            "total_discount_amount": totals['total_discount'] or 0
         }
 
-        return {"orders": order_details, "summary": summary}
+        # Convert the whole result set with the one rate looked up above
+        convert_rows(order_details, ("total_purchase_amount", "discount_amount"), rate)
+        convert_rows([summary], ("total_purchase_amount", "total_discount_amount"), rate)
+
+        # Totals per currency paid in, from one grouped query; converted_* is in the report's currency
+        by_currency = [
+            {
+                "currency": row['paid_currency'],
+                "orders": row['orders'],
+                "total_items_purchased": row['total_items'],
+                "total_purchase_amount": round_amount(row['local_purchase']),
+                "total_discount_amount": round_amount(row['local_discount']),
+                "converted_total_purchase_amount": convert_amount(row['total_purchase'], rate),
+            }
+            for row in orders.values('paid_currency').annotate(
+                orders=Count('pk'),
+                total_items=Sum('total_items_purchased'),
+                total_purchase=Sum('total_amount'),
+                local_purchase=Sum(LOCAL_PURCHASE),
+                local_discount=Sum(LOCAL_DISCOUNT)
+            ).order_by('paid_currency')
+        ]
+
+        return {
+            "currency": normalize_currency(currency),
+            "orders": order_details,
+            "summary": summary,
+            "by_currency": by_currency
+        }
 
 
 class CouponService:
@@ -138,4 +432,182 @@ class CouponService:
         while CouponCode.objects.filter(code=code).exists():
             code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
 
-        return CouponCode.objects.create(code=code, order_n=nth_order)
\ No newline at end of file
+        return CouponCode.objects.create(code=code, order_n=nth_order)
+
+class InventoryService:
+    """
+    Stock tracking with striped counters.
+
+    A tracked product's stock is split across INVENTORY_STOCK_STRIPES StockStripe rows. Buyers decrement a
+    randomly chosen stripe, so concurrent checkouts of one popular product rarely wait on the same row lock.
+    Adding to a cart reserves stock for STOCK_RESERVATION_TTL_SECONDS; checkout converts the reservations
+    into sales. Products without stripes are not tracked and never run out.
+    """
+
+    @staticmethod
+    @transaction.atomic
+    def set_stock(product, quantity):
+        """
+        Set the stock available for new reservations, spread evenly across the product's stripes.
+        """
+        stripes = list(StockStripe.objects.select_for_update().filter(product=product).order_by('stripe'))
+        if not stripes:
+            stripes = StockStripe.objects.bulk_create(
+                StockStripe(product=product, stripe=index) for index in range(settings.INVENTORY_STOCK_STRIPES)
+            )
+
+        base, extra = divmod(quantity, len(stripes))
+        for index, stripe in enumerate(stripes):
+            stripe.available = base + (1 if index < extra else 0)
+        StockStripe.objects.bulk_update(stripes, ['available'])
+
+    @staticmethod
+    def available_stock(product):
+        """
+        Return the unreserved stock of a product, or None if its stock is not tracked.
+        """
+        return StockStripe.objects.filter(product=product).aggregate(available=Sum('available'))['available']
+
+    @staticmethod
+    @transaction.atomic
+    def reserve(cart, product_id, quantity):
+        """
+        Hold quantity units of a product for the cart.
+
+        Raises:
+            ValueError: If not enough stock is available.
+        """
+        stripe_ids = list(StockStripe.objects.filter(product_id=product_id).order_by('stripe').values_list('pk', flat=True))
+        if not stripe_ids:
+            return
+
+        expires_at = timezone.now() + timedelta(seconds=settings.STOCK_RESERVATION_TTL_SECONDS)
+
+        # Fast path: take everything from one stripe with a conditional decrement, starting at a random one
+        offset = random.randrange(len(stripe_ids))
+        for stripe_id in stripe_ids[offset:] + stripe_ids[:offset]:
+            if StockStripe.objects.filter(pk=stripe_id, available__gte=quantity).update(available=F('available') - quantity):
+                StockReservation.objects.create(
+                    cart=cart, stock_stripe_id=stripe_id, quantity=quantity, expires_at=expires_at
+                )
+                return
+
+        # Slow path: no single stripe has enough, so lock all of them (in a fixed order) and combine
+        stripes = list(StockStripe.objects.select_for_update().filter(pk__in=stripe_ids).order_by('stripe'))
+        if sum(stripe.available for stripe in stripes) < quantity:
+            # Stock may only be held by expired reservations that have not been swept yet
+            if not InventoryService.release_expired(product_id=product_id):
+                raise ValueError(f"Not enough stock for product #{product_id}.")
+            stripes = list(StockStripe.objects.select_for_update().filter(pk__in=stripe_ids).order_by('stripe'))
+            if sum(stripe.available for stripe in stripes) < quantity:
+                raise ValueError(f"Not enough stock for product #{product_id}.")
+
+        remaining = quantity
+        for stripe in stripes:
+            taken = min(stripe.available, remaining)
+            if taken:
+                StockStripe.objects.filter(pk=stripe.pk).update(available=F('available') - taken)
+                StockReservation.objects.create(cart=cart, stock_stripe=stripe, quantity=taken, expires_at=expires_at)
+                remaining -= taken
+            if not remaining:
+                break
+
+    @staticmethod
+    def extend_reservations(cart):
+        """
+        Keep the cart's reservations alive for another TTL; called on cart activity.
+        """
+        expires_at = timezone.now() + timedelta(seconds=settings.STOCK_RESERVATION_TTL_SECONDS)
+        StockReservation.objects.filter(cart=cart).update(expires_at=expires_at)
+
+    @staticmethod
+    @transaction.atomic
+    def release(reservations, skip_locked=False):
+        """
+        Return the stock held by the given reservations and delete them.
+
+        Returns:
+            int: The number of units released.
+        """
+        held = list(
+            reservations.select_for_update(skip_locked=skip_locked, of=('self',))
+            .values_list('pk', 'stock_stripe_id', 'quantity')
+        )
+        per_stripe = defaultdict(int)
+        for _, stripe_id, quantity in held:
+            per_stripe[stripe_id] += quantity
+
+        # Update stripes in a fixed order so concurrent releases cannot deadlock
+        for stripe_id, quantity in sorted(per_stripe.items()):
+            StockStripe.objects.filter(pk=stripe_id).update(available=F('available') + quantity)
+        StockReservation.objects.filter(pk__in=[pk for pk, _, _ in held]).delete()
+        return sum(per_stripe.values())
+
+    @staticmethod
+    def release_expired(product_id=None, batch_size=1000):
+        """
+        Release expired reservations in batches, skipping any a checkout is converting right now.
+
+        Returns:
+            int: The number of units released.
+        """
+        expired = StockReservation.objects.filter(expires_at__lt=timezone.now())
+        if product_id is not None:
+            expired = expired.filter(stock_stripe__product_id=product_id)
+
+        released = 0
+        while True:
+            batch = list(expired.order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                return released
+            units = InventoryService.release(StockReservation.objects.filter(pk__in=batch), skip_locked=True)
+            if not units:
+                return released
+            released += units
+
+    @staticmethod
+    def convert_cart_reservations(cart):
+        """
+        Turn the cart's reservations into sales; must run inside the checkout transaction.
+
+        Lines whose reservations expired and were released are reserved again first, so checkout fails
+        rather than oversells when the stock has gone in the meantime.
+
+        Raises:
+            ValueError: If a line can no longer be covered by the available stock.
+        """
+        reservations = list(
+            StockReservation.objects.select_for_update(of=('self',))
+            .filter(cart=cart)
+            .values_list('stock_stripe__product_id', 'quantity')
+        )
+        held = defaultdict(int)
+        for product_id, quantity in reservations:
+            held[product_id] += quantity
+
+        needed = dict(cart.items.values_list('product_id', 'quantity'))
+        # One pass in product id order, like add_items_to_cart, so concurrent checkouts lock stripes in the
+        # same order
+        for product_id in sorted(held.keys() | needed.keys()):
+            quantity = needed.get(product_id, 0)
+            if held[product_id] > quantity:
+                # The line was lowered after reserving; hand the stock back and reserve the exact amount
+                InventoryService.release(StockReservation.objects.filter(cart=cart, stock_stripe__product_id=product_id))
+                held[product_id] = 0
+            if quantity > held[product_id]:
+                InventoryService.reserve(cart, product_id, quantity - held[product_id])
+
+        StockReservation.objects.filter(cart=cart).delete()
+
+
+def release_deleted_cart_stock(sender, instance, **kwargs):
+    """
+    Return the stock held by a cart that is being deleted; connected to Cart pre_delete.
+
+    Covers deletes that bypass the services, such as the admin's delete action or deleting the cart's user.
+    """
+    InventoryService.release(instance.stock_reservations.all())
+
+
+# No-op unless SERVICE_PROFILE_DIR is set; see store.profiling
+profile_services(CartService, OrderService, CouponService)
@@ -0,0 +1,57 @@
+"""
+Boot a fresh Django process phase by phase and print the phase timings as JSON.
+
+Run by the profile_startup management command as
+``python -X importtime -m store.startup_profile <url> [<username>]``; the requests are made as the given
+user, if any. The per-module import times come from the interpreter's ``-X importtime`` output on stderr.
+"""
+import json
+import os
+import sys
+from time import perf_counter
+
+
+def elapsed_ms(started):
+    return round((perf_counter() - started) * 1000, 2)
+
+
+def main(url, username=None):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'unicart.settings')
+    phases = {}
+    boot_started = perf_counter()
+
+    started = perf_counter()
+    from django.conf import settings
+    settings.INSTALLED_APPS  # Accessing a setting imports the settings module
+    phases['settings'] = elapsed_ms(started)
+
+    started = perf_counter()
+    import django
+    django.setup()
+    phases['app_registry'] = elapsed_ms(started)
+
+    started = perf_counter()
+    from django.urls import get_resolver
+    get_resolver().url_patterns  # Imports the URLconf and every view module it references
+    phases['urlconf'] = elapsed_ms(started)
+    phases['boot_total'] = elapsed_ms(boot_started)
+
+    from django.test import Client
+    client = Client()
+    if username:
+        from django.contrib.auth.models import User
+        client.force_login(User.objects.get(username=username))
+
+    started = perf_counter()
+    response = client.get(url)
+    phases['first_request'] = elapsed_ms(started)
+
+    started = perf_counter()
+    client.get(url)
+    phases['second_request'] = elapsed_ms(started)
+
+    json.dump({'phases_ms': phases, 'url': url, 'status_code': response.status_code}, sys.stdout)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:3])
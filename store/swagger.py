@@ -1,20 +1,76 @@
+from functools import lru_cache
+from django.conf import settings
+from django.views.decorators.http import conditional_page
 from drf_yasg import openapi
-from drf_yasg.views import get_schema_view
 from rest_framework import permissions
+from rest_framework.response import Response
 
-schema_view = get_schema_view(
-    openapi.Info(
-        title="Unicart API",
-        default_version='v1',
-        description="API documentation for Unicart e-commerce platform",
-        terms_of_service="https://www.unicart.com/terms/",
-        contact=openapi.Contact(email="contact@unicart.com"),
-        license=openapi.License(name="MIT License"),
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
+api_info = openapi.Info(
+    title="Unicart API",
+    default_version='v1',
+    description="API documentation for Unicart e-commerce platform",
+    terms_of_service="https://www.unicart.com/terms/",
+    contact=openapi.Contact(email="contact@unicart.com"),
+    license=openapi.License(name="MIT License"),
 )
 
+
+@lru_cache(maxsize=None)
+def get_cached_schema_view():
+    """
+    Build the drf_yasg schema view class on first use.
+
+    drf_yasg.views pulls in the spec validators and jsonschema, which dominate the import time of this
+    module, so they are only imported when the schema is first requested. The schema is public and the
+    same for every user, so each process generates it once per API URL and reuses it.
+
+    Without SWAGGER_API_URL drf_yasg takes the schema's host and scheme from the request, so schemas are
+    cached per request origin; otherwise one request's Host header would be served to everyone.
+    """
+    from drf_yasg.renderers import _SpecRenderer
+    from drf_yasg.views import get_schema_view
+
+    schema_view = get_schema_view(
+        api_info, url=settings.SWAGGER_API_URL, public=True, permission_classes=(permissions.AllowAny,)
+    )
+
+    class CachedSchemaView(schema_view):
+        schemas = {}
+        max_schemas = 32  # Request hosts are client-controlled, so the cache must not grow without bound
+
+        def get(self, request, version='', format=None):
+            # UI pages only need an empty schema; spec renderers need the full one
+            origin = None if settings.SWAGGER_API_URL else request.build_absolute_uri('/')
+            key = (origin, request.version or version or '', isinstance(request.accepted_renderer, _SpecRenderer))
+            if key not in self.schemas:
+                if len(self.schemas) >= self.max_schemas:
+                    self.schemas.clear()
+                self.schemas[key] = super().get(request, version, format).data
+            return Response(self.schemas[key])
+
+    return CachedSchemaView
+
+
+@lru_cache(maxsize=None)
+def get_schema_ui_view(renderer=None):
+    schema_view = get_cached_schema_view()
+    if renderer is None:
+        return schema_view.without_ui(cache_timeout=0)
+    return schema_view.with_ui(renderer, cache_timeout=0)
+
+
+def lazy_schema_view(renderer=None):
+    """
+    Return a URL view for the schema (renderer=None) or a schema UI that is built on its first request.
+
+    Responses carry an ETag of their content and unchanged schemas are answered with 304 Not Modified.
+    """
+    @conditional_page
+    def view(request, *args, **kwargs):
+        return get_schema_ui_view(renderer)(request, *args, **kwargs)
+
+    return view
+
 error_responses = {
     400: openapi.Response(
         description="Bad Request",
@@ -45,6 +101,13 @@ error_responses = {
     )
 }
 
+currency_parameter = openapi.Parameter(
+    'currency',
+    openapi.IN_QUERY,
+    description='Show amounts in this currency (ISO 4217 code); defaults to the store currency',
+    type=openapi.TYPE_STRING
+)
+
 cart_add_item = {
     "operation_summary": "Add item to cart",
     "operation_description": "Add a product item to the user's shopping cart with specified quantity",
@@ -92,6 +155,7 @@ cart_add_item = {
 cart_add_items = {
     "operation_summary": "Add multiple items to cart",
     "operation_description": "Add multiple product items to the user's shopping cart with specified quantities.",
+    "manual_parameters": [currency_parameter],
     "request_body": openapi.Schema(
         type=openapi.TYPE_OBJECT,
         required=['products'],
@@ -132,7 +196,8 @@ cart_add_items = {
                                     type=openapi.TYPE_OBJECT,
                                     properties={
                                         'product': openapi.Schema(type=openapi.TYPE_OBJECT),
-                                        'quantity': openapi.Schema(type=openapi.TYPE_INTEGER)
+                                        'quantity': openapi.Schema(type=openapi.TYPE_INTEGER),
+                                        'unit_price': openapi.Schema(type=openapi.TYPE_NUMBER)
                                     }
                                 )
                             ),
@@ -163,6 +228,93 @@ cart_add_items = {
     }
 }
 
+# Amounts are rendered as decimal strings, like DRF's DecimalField
+amount_schema = openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_DECIMAL)
+
+cart_item_schema = openapi.Schema(
+    type=openapi.TYPE_OBJECT,
+    properties={
+        'product': openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'id': openapi.Schema(type=openapi.TYPE_INTEGER),
+                'name': openapi.Schema(type=openapi.TYPE_STRING),
+                'price': amount_schema
+            }
+        ),
+        'quantity': openapi.Schema(type=openapi.TYPE_INTEGER),
+        'unit_price': amount_schema
+    }
+)
+
+cart_retrieve = {
+    "operation_summary": "Get cart",
+    "operation_description": "Return the user's cart after applying every recorded cart event",
+    "manual_parameters": [currency_parameter],
+    "responses": {
+        200: openapi.Response(
+            description="The user's cart",
+            schema=openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'user': openapi.Schema(type=openapi.TYPE_INTEGER),
+                    'items': openapi.Schema(type=openapi.TYPE_ARRAY, items=cart_item_schema),
+                    'total_amount': amount_schema,
+                    'currency': openapi.Schema(
+                        type=openapi.TYPE_STRING,
+                        description='Only with ?currency=; every amount is then converted to it'
+                    )
+                }
+            )
+        ),
+        404: error_responses[404]
+    }
+}
+
+cart_events = {
+    "operation_summary": "Record cart events",
+    "operation_description": (
+        "Append add, set and remove changes to the user's cart event log. Events are applied in order the "
+        "next time the cart is read or checked out, which also reserves their stock; lines the stock cannot "
+        "cover stay in the cart unreserved and fail at checkout."
+    ),
+    "request_body": openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        required=['events'],
+        properties={
+            'events': openapi.Schema(
+                type=openapi.TYPE_ARRAY,
+                items=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    required=['product_id', 'action'],
+                    properties={
+                        'product_id': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'action': openapi.Schema(type=openapi.TYPE_STRING, enum=['add', 'set', 'remove']),
+                        'quantity': openapi.Schema(
+                            type=openapi.TYPE_INTEGER,
+                            description='Units to add (default 1) or the new quantity for set; 0 removes the line',
+                            minimum=0
+                        ),
+                    }
+                )
+            ),
+        }
+    ),
+    "responses": {
+        202: openapi.Response(
+            description="Events recorded",
+            schema=openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'recorded': openapi.Schema(type=openapi.TYPE_INTEGER)
+                }
+            )
+        ),
+        400: error_responses[400],
+        404: error_responses[404]
+    }
+}
+
 cart_checkout = {
     "operation_summary": "Checkout cart",
     "operation_description": "Process checkout for the current cart, optionally applying a discount code",
@@ -173,6 +325,10 @@ cart_checkout = {
                 type=openapi.TYPE_STRING,
                 description='Optional discount coupon code'
             ),
+            'currency': openapi.Schema(
+                type=openapi.TYPE_STRING,
+                description='Optional currency the customer pays in; recorded on the order as paid_currency'
+            ),
         }
     ),
     "responses": {
@@ -188,8 +344,14 @@ cart_checkout = {
                         type=openapi.TYPE_STRING,
                         nullable=True
                     ),
-                    'total_amount': openapi.Schema(type=openapi.TYPE_NUMBER),
-                    'created_at': openapi.Schema(type=openapi.TYPE_STRING, format='date-time')
+                    'total_amount': openapi.Schema(type=openapi.TYPE_NUMBER, description='In the store currency'),
+                    'created_at': openapi.Schema(type=openapi.TYPE_STRING, format='date-time'),
+                    'paid_currency': openapi.Schema(type=openapi.TYPE_STRING),
+                    'paid_exchange_rate': openapi.Schema(type=openapi.TYPE_STRING),
+                    'paid_total_amount': openapi.Schema(
+                        type=openapi.TYPE_STRING,
+                        description='What the customer was charged, in paid_currency'
+                    )
                 }
             )
         ),
@@ -230,6 +392,23 @@ generate_discount_code = {
 report = {
     "operation_summary": "Generate sales report",
     "operation_description": "Generate a report of sales statistics and discount usage (Admin only)",
+    "manual_parameters": [
+        openapi.Parameter(
+            'start',
+            openapi.IN_QUERY,
+            description='Only include orders created on or after this date (YYYY-MM-DD)',
+            type=openapi.TYPE_STRING,
+            format=openapi.FORMAT_DATE
+        ),
+        openapi.Parameter(
+            'end',
+            openapi.IN_QUERY,
+            description='Only include orders created before this date (YYYY-MM-DD)',
+            type=openapi.TYPE_STRING,
+            format=openapi.FORMAT_DATE
+        ),
+        currency_parameter,
+    ],
     "responses": {
         200: openapi.Response(
             description="Report generated successfully",
@@ -257,6 +436,25 @@ report = {
                             'total_purchase_amount': openapi.Schema(type=openapi.TYPE_NUMBER),
                             'total_discount_amount': openapi.Schema(type=openapi.TYPE_NUMBER)
                         }
+                    ),
+                    'currency': openapi.Schema(type=openapi.TYPE_STRING),
+                    'by_currency': openapi.Schema(
+                        type=openapi.TYPE_ARRAY,
+                        description='Totals per currency paid in, in that currency',
+                        items=openapi.Schema(
+                            type=openapi.TYPE_OBJECT,
+                            properties={
+                                'currency': openapi.Schema(type=openapi.TYPE_STRING),
+                                'orders': openapi.Schema(type=openapi.TYPE_INTEGER),
+                                'total_items_purchased': openapi.Schema(type=openapi.TYPE_INTEGER),
+                                'total_purchase_amount': openapi.Schema(type=openapi.TYPE_NUMBER),
+                                'total_discount_amount': openapi.Schema(type=openapi.TYPE_NUMBER),
+                                'converted_total_purchase_amount': openapi.Schema(
+                                    type=openapi.TYPE_NUMBER,
+                                    description='The purchase total in the report currency'
+                                )
+                            }
+                        )
                     )
                 }
             )
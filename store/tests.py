@@ -1,7 +1,43 @@
-from django.test import TestCase
+import gzip
+import io
+import os
+import pstats
+import subprocess
+import sys
+import json
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest import mock, skipUnless
+from datetime import timedelta
+from decimal import Decimal
+from django.core.management import CommandError, call_command
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, connections, transaction
+from django.db.models import Sum
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.test import TestCase, TransactionTestCase, SimpleTestCase, RequestFactory, modify_settings, override_settings
+from django.http import HttpResponse
 from django.contrib.auth.models import User
 from rest_framework.test import APIClient
-from .models import Product, Cart, CartItem, CouponCode, Order
+from .models import (
+    Product, Cart, CartItem, CouponCode, Order, ArchivedOrderPeriod, UserOrderCounter, StockReservation, CartEvent,
+    ExchangeRate, OrderNumber
+)
+from .services import CartService, OrderService, InventoryService
+from .serializers import (
+    CartSerializer, OrderSerializer, CouponCodeSerializer, FlatCartSerializer, FlatOrderSerializer,
+    FlatCouponCodeSerializer
+)
+from .renderers import FastJSONRenderer
+from rest_framework.renderers import JSONRenderer
+from .middleware import ReplicaPinningMiddleware, PIN_COOKIE_NAME
+from .routers import ReplicaRouter, is_pinned_to_primary, use_primary
+from .profiling import check_profile_settings, profiled, rotate_profiles
+from .currency import get_rate, invalidate_rates
 
 
 class CartViewSetTestCase(TestCase):
@@ -108,3 +144,826 @@ class CartViewSetTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn('orders', response.data)
         self.assertIn('summary', response.data)
+
+
+@override_settings(DATABASE_REPLICAS=['replica_0'])
+class ReplicaRouterTestCase(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def test_report_and_catalog_reads_use_replica(self):
+        """Test that order, coupon and product reads are routed to a replica."""
+        with use_primary(False):
+            for model in (Order, CouponCode, Product):
+                self.assertEqual(self.router.db_for_read(model), 'replica_0')
+
+    def test_cart_reads_use_primary(self):
+        """Test that cart reads never leave the primary."""
+        with use_primary(False):
+            self.assertEqual(self.router.db_for_read(Cart), 'default')
+            self.assertEqual(self.router.db_for_read(CartItem), 'default')
+
+    def test_reads_after_write_are_pinned(self):
+        """Test that a write pins the following reads in the same context to the primary."""
+        with use_primary(False):
+            self.assertEqual(self.router.db_for_write(Order), 'default')
+            self.assertEqual(self.router.db_for_read(Order), 'default')
+        self.assertFalse(is_pinned_to_primary())
+
+    def test_writes_outside_a_scope_do_not_pin(self):
+        """Test that a write made outside use_primary(), e.g. by a management command, pins nothing."""
+        self.assertEqual(self.router.db_for_write(Order), 'default')
+        self.assertFalse(is_pinned_to_primary())
+        self.assertEqual(self.router.db_for_read(Order), 'replica_0')
+
+    def test_middleware_pins_write_requests(self):
+        """Test that unsafe requests run on the primary and set the pinning cookie."""
+        seen = []
+        middleware = ReplicaPinningMiddleware(lambda request: seen.append(is_pinned_to_primary()) or HttpResponse())
+
+        response = middleware(self.factory.get('/api/cart/report/'))
+        self.assertNotIn(PIN_COOKIE_NAME, response.cookies)
+
+        response = middleware(self.factory.post('/api/cart/checkout/'))
+        self.assertIn(PIN_COOKIE_NAME, response.cookies)
+
+        request = self.factory.get('/api/cart/report/')
+        request.COOKIES[PIN_COOKIE_NAME] = '1'
+        middleware(request)
+        self.assertEqual(seen, [False, True, True])
+
+
+# Defined only when DATABASE_REPLICA_URLS is set; test replicas mirror the default database
+REPLICA_ALIASES = {'replica_0'} & set(settings.DATABASES)
+
+
+@skipUnless(REPLICA_ALIASES, 'Set DATABASE_REPLICA_URLS to test routing against a replica alias')
+@override_settings(DATABASE_REPLICAS=['replica_0'], DATABASE_ROUTERS=['store.routers.ReplicaRouter'])
+class ReplicaDatabaseTestCase(TransactionTestCase):
+    # Not TestCase: its per-test transaction would keep every read on the primary
+    databases = {'default'} | REPLICA_ALIASES
+
+    def test_reads_use_the_replica_connection(self):
+        """Test that catalog reads are sent over the replica connection and cart reads over the primary."""
+        with use_primary(False):
+            with CaptureQueriesContext(connections['replica_0']) as replica_queries:
+                list(Product.objects.all())
+                list(Cart.objects.all())
+        self.assertEqual([query['sql'] for query in replica_queries], [str(Product.objects.all().query)])
+
+    def test_reads_in_a_transaction_use_the_primary(self):
+        """Test that reads inside a transaction, e.g. a service's read-modify-write, stay on the primary."""
+        with use_primary(False), transaction.atomic():
+            with CaptureQueriesContext(connections['replica_0']) as replica_queries:
+                list(Product.objects.all())
+        self.assertEqual(len(replica_queries), 0)
+
+
+class OrderArchivalTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.admin_user = User.objects.create_superuser(username='admin', password='adminpassword')
+        self.client = APIClient()
+
+        # One order from well over a year ago and one from today
+        self.old_order = Order.objects.create(user=self.user, total_amount=100.00, total_items_purchased=1)
+        Order.objects.filter(pk=self.old_order.pk).update(created_at=timezone.now() - timedelta(days=500))
+        self.recent_order = Order.objects.create(user=self.user, total_amount=50.00, total_items_purchased=2)
+
+    def test_report_date_range(self):
+        """Test that the report only includes orders inside the requested date range."""
+        self.client.login(username='admin', password='adminpassword')
+        start = (timezone.now() - timedelta(days=30)).date().isoformat()
+
+        response = self.client.get('/api/cart/report/', {'start': start})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([order['order_number'] for order in response.data['orders']], [2])
+        self.assertEqual(response.data['summary']['total_items_purchased'], 2)
+
+        response = self.client.get('/api/cart/report/', {'start': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_archive_orders_to_file(self):
+        """Test archiving closed months to files without touching recent orders."""
+        with tempfile.TemporaryDirectory() as output_dir:
+            call_command('archive_orders', keep_months=1, output_dir=output_dir, stdout=io.StringIO())
+
+            period = ArchivedOrderPeriod.objects.get()
+            self.assertEqual(period.order_count, 1)
+            self.assertEqual(period.max_order_number, 1)
+            with gzip.open(period.location, 'rt') as archive:
+                rows = [json.loads(line) for line in archive]
+
+        self.assertEqual([row['order_number'] for row in rows], [1])
+        self.assertEqual(list(Order.objects.values_list('order_number', flat=True)), [2])
+
+    def test_archived_orders_stay_counted(self):
+        """Test that archiving keeps the users' order counts, which the backfill can then no longer rebuild."""
+        with tempfile.TemporaryDirectory() as output_dir:
+            call_command('archive_orders', keep_months=1, output_dir=output_dir, stdout=io.StringIO())
+
+        self.assertEqual(OrderService.lock_order_counter(self.user).order_count, 2)
+        with self.assertRaisesMessage(CommandError, 'order counters can only be rebuilt before'):
+            call_command('backfill_order_counters', stdout=io.StringIO())
+
+    def test_order_number_continues_after_archival(self):
+        """Test that order numbers are not reused once every order has been archived."""
+        # A database whose orders were archived before the counter existed
+        Order.objects.all().delete()
+        OrderNumber.objects.all().delete()
+        ArchivedOrderPeriod.objects.create(period_start='2024-01-01', order_count=2, max_order_number=2, location='x')
+
+        order = Order.objects.create(user=self.user, total_amount=10.00)
+        self.assertEqual(order.order_number, 3)
+
+    def test_order_numbers_come_from_the_counter(self):
+        """Test that the counter starts after the existing orders and keeps counting once they are gone."""
+        self.assertEqual(OrderNumber.objects.get().last_number, 2)
+        Order.objects.all().delete()
+
+        # Issued numbers are remembered even once their orders are gone
+        self.assertEqual(Order.objects.create(user=self.user, total_amount=10.00).order_number, 3)
+        self.assertEqual(OrderNumber.objects.get().last_number, 3)
+
+
+class UserOrderCounterTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.other_user = User.objects.create_user(username='otheruser', password='password')
+        self.product = Product.objects.create(name="Product 1", price=100.00)
+
+        # Other users' orders advance the global order number but not this user's order count
+        for _ in range(3):
+            Order.objects.create(user=self.other_user, total_amount=10.00)
+        Order.objects.create(user=self.user, total_amount=10.00)
+
+    def test_nth_order_coupon_uses_per_user_count(self):
+        """Test that the nth-order coupon rule counts only the user's own orders."""
+        coupon = CouponCode.objects.create(code="SECOND", order_n=2, discount_percentage=10.00)
+        CartService.add_items_to_cart(self.user, [{'product_id': self.product.id, 'quantity': 2}])
+
+        order = OrderService.checkout_cart(self.user, coupon.code)
+        self.assertEqual(order.total_amount, 180.00)
+        self.assertEqual(UserOrderCounter.objects.get(user=self.user).order_count, 2)
+
+    def test_invalid_coupon_does_not_advance_counter(self):
+        """Test that a rejected checkout leaves the order counter untouched."""
+        CouponCode.objects.create(code="FIFTH", order_n=5)
+        CartService.add_items_to_cart(self.user, [{'product_id': self.product.id, 'quantity': 1}])
+
+        with self.assertRaises(ValueError):
+            OrderService.checkout_cart(self.user, "FIFTH")
+        self.assertFalse(UserOrderCounter.objects.filter(user=self.user).exists())
+
+    def test_backfill_order_counters(self):
+        """Test rebuilding the counters from existing orders."""
+        UserOrderCounter.objects.create(user=self.user, order_count=7)
+        call_command('backfill_order_counters', stdout=io.StringIO())
+
+        counts = dict(UserOrderCounter.objects.values_list('user__username', 'order_count'))
+        self.assertEqual(counts, {'testuser': 1, 'otheruser': 3})
+
+
+class FlatSerializerTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.product = Product.objects.create(name="Prodüct 1", price=99.99)
+        self.coupon = CouponCode.objects.create(code="SECOND", order_n=2, discount_percentage=12.5)
+
+    def test_flat_serializers_match_model_serializers(self):
+        """Test that the flat serializers produce the same output as the ModelSerializers."""
+        cart = CartService.add_items_to_cart(self.user, [{'product_id': self.product.id, 'quantity': 3}])
+        self.assertEqual(FlatCartSerializer(cart).data, CartSerializer(cart).data)
+
+        coupons = CouponCode.objects.all()
+        self.assertEqual(FlatCouponCodeSerializer(coupons, many=True).data, CouponCodeSerializer(coupons, many=True).data)
+
+        order = Order.objects.create(
+            user=self.user, discount_code=self.coupon, total_amount=cart.total_amount * Decimal('0.875'), total_items_purchased=3
+        )
+        self.assertEqual(FlatOrderSerializer(order).data, OrderSerializer(order).data)
+        order.refresh_from_db()
+        self.assertEqual(FlatOrderSerializer(order).data, OrderSerializer(order).data)
+
+    def test_fast_renderer_matches_json_renderer(self):
+        """Test that the fast renderer output decodes to the same data as DRF's JSONRenderer."""
+        CartService.add_items_to_cart(self.user, [{'product_id': self.product.id, 'quantity': 1}])
+        OrderService.checkout_cart(self.user)
+        data = OrderService.generate_report()
+        data['created_at'] = timezone.now()
+        data['note'] = 'line\u2028separator'
+
+        fast = FastJSONRenderer().render(data)
+        self.assertEqual(json.loads(fast), json.loads(JSONRenderer().render(data)))
+        self.assertNotIn(b'\xe2\x80\xa8', fast)
+
+
+@override_settings(CART_EXPIRY_DAYS=30)
+class CartExpiryTestCase(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name="Product 1", price=100.00)
+        self.users = [User.objects.create_user(username=f'user{i}', password='password') for i in range(5)]
+        for user in self.users:
+            CartService.add_items_to_cart(user, [{'product_id': self.product.id, 'quantity': 1}])
+
+        # The first three carts were abandoned two months ago
+        self.abandoned = self.users[:3]
+        Cart.objects.filter(user__in=self.abandoned).update(updated_at=timezone.now() - timedelta(days=60))
+
+    def test_cleanup_carts_deletes_only_expired(self):
+        """Test that the cleanup command removes expired carts and their items in batches."""
+        out = io.StringIO()
+        call_command('cleanup_carts', batch_size=2, sleep=0, stdout=out)
+
+        self.assertEqual(set(Cart.objects.values_list('user__username', flat=True)), {'user3', 'user4'})
+        self.assertEqual(CartItem.objects.count(), 2)
+        self.assertIn('Deleted 3 carts and 3 cart items in 2 batches', out.getvalue())
+
+    def test_expired_cart_is_reset_on_add(self):
+        """Test that adding to an expired cart starts a fresh cart."""
+        cart = CartService.add_items_to_cart(self.abandoned[0], [{'product_id': self.product.id, 'quantity': 2}])
+        self.assertEqual(cart.items.get().quantity, 2)
+        self.assertFalse(cart.is_expired())
+
+    def test_expired_cart_cannot_checkout(self):
+        """Test that an expired cart is rejected at checkout."""
+        with self.assertRaisesMessage(ValueError, 'Cart has expired.'):
+            OrderService.checkout_cart(self.abandoned[0])
+
+
+class SchemaViewTestCase(TestCase):
+    def test_schema_is_generated_once_and_served_with_etag(self):
+        """Test that the OpenAPI schema is cached in memory and revalidated with ETags."""
+        from drf_yasg.generators import OpenAPISchemaGenerator
+        from .swagger import get_cached_schema_view
+
+        get_cached_schema_view().schemas.clear()
+        with mock.patch.object(
+            OpenAPISchemaGenerator, 'get_schema', autospec=True, side_effect=OpenAPISchemaGenerator.get_schema
+        ) as get_schema:
+            response = self.client.get('/swagger.json/')
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('/cart/report/', json.loads(response.content)['paths'])
+            etag = response['ETag']
+
+            response = self.client.get('/swagger.json/', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(get_schema.call_count, 1)
+
+    def test_schema_host_is_not_shared_between_hosts(self):
+        """Test that a schema generated for one Host header is never served to another host."""
+        from .swagger import get_cached_schema_view
+
+        get_cached_schema_view().schemas.clear()
+        self.client.get('/swagger.json/', HTTP_HOST='evil.example')
+        response = self.client.get('/swagger.json/', HTTP_HOST='api.unicart.com')
+        self.assertEqual(json.loads(response.content)['host'], 'api.unicart.com')
+
+    def test_cart_schema_matches_the_response(self):
+        """Test that the documented GET /api/cart/ fields are the ones the cart serializer returns."""
+        user = User.objects.create_user(username='testuser', password='password')
+        product = Product.objects.create(name="Product 1", price=10.00)
+        cart = CartService.add_items_to_cart(user, [{'product_id': product.id, 'quantity': 1}])
+        data = FlatCartSerializer(cart, context={'currency': 'USD', 'exchange_rate': Decimal(1)}).data
+
+        schema = json.loads(self.client.get('/swagger.json/').content)
+        properties = schema['paths']['/cart/']['get']['responses']['200']['schema']['properties']
+        self.assertEqual(set(properties), set(data))
+        item = properties['items']['items']['properties']
+        self.assertEqual(set(item), set(data['items'][0]))
+        self.assertEqual(set(item['product']['properties']), set(data['items'][0]['product']))
+
+
+class StartupProfileTestCase(SimpleTestCase):
+    def test_profile_startup_report(self):
+        """Test that the startup profiler emits a machine-readable report."""
+        out = io.StringIO()
+        call_command('profile_startup', runs=1, top=5, stdout=out)
+        report = json.loads(out.getvalue())
+
+        self.assertEqual((report['url'], report['status_code']), ('/swagger.json/', 200))
+        self.assertEqual(
+            set(report['phases_ms']),
+            {'settings', 'app_registry', 'urlconf', 'boot_total', 'first_request', 'second_request'}
+        )
+        self.assertEqual(
+            set(report['modules_ms']),
+            {'unicart.settings', 'store.views', 'store.swagger', 'rest_framework', 'drf_yasg'}
+        )
+        self.assertGreater(report['modules_ms']['store.views'], 0)
+        self.assertEqual(len(report['slowest_imports_ms']), 5)
+
+    def test_boot_does_not_import_schema_generation(self):
+        """Test that loading the URLconf leaves drf_yasg's schema views unimported until first use."""
+        script = (
+            'import sys, django; django.setup(); '
+            'from django.urls import get_resolver; get_resolver().url_patterns; '
+            'print("drf_yasg.views" in sys.modules)'
+        )
+        result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), 'False')
+
+
+class CartPriceSnapshotTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.product1 = Product.objects.create(name="Product 1", price=100.00)
+        self.product2 = Product.objects.create(name="Product 2", price=200.00)
+        CartService.add_items_to_cart(self.user, [
+            {'product_id': self.product1.id, 'quantity': 2},
+            {'product_id': self.product2.id, 'quantity': 1}
+        ])
+        Product.objects.filter(pk=self.product1.pk).update(price=150.00)
+
+    def test_checkout_uses_snapshot_without_reading_products(self):
+        """Test that checkout totals come from the price snapshots, not live product prices."""
+        with CaptureQueriesContext(connection) as queries:
+            order = OrderService.checkout_cart(self.user)
+
+        self.assertEqual(order.total_amount, 400.00)
+        self.assertEqual(order.total_items_purchased, 3)
+        self.assertFalse([q['sql'] for q in queries.captured_queries if Product._meta.db_table in q['sql']])
+
+    def test_reprice_carts(self):
+        """Test repricing carts after a catalog price change."""
+        other = User.objects.create_user(username='otheruser', password='password')
+        CartService.add_items_to_cart(other, [{'product_id': self.product2.id, 'quantity': 1}])
+
+        call_command('reprice_carts', product_ids=[self.product1.id], batch_size=1, stdout=io.StringIO())
+
+        cart = Cart.objects.get(user=self.user)
+        self.assertEqual(cart.total_amount, 500.00)
+        self.assertEqual(cart.items.get(product=self.product1).unit_price, 150.00)
+        self.assertEqual(Cart.objects.get(user=other).total_amount, 200.00)
+
+
+@override_settings(INVENTORY_STOCK_STRIPES=4)
+class InventoryTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.product = Product.objects.create(name="Product 1", price=100.00)
+        InventoryService.set_stock(self.product, 10)
+
+    def add(self, user, quantity):
+        return CartService.add_items_to_cart(user, [{'product_id': self.product.id, 'quantity': quantity}])
+
+    def test_stock_is_spread_across_stripes(self):
+        """Test that set_stock splits the stock evenly across the configured stripes."""
+        self.assertEqual(list(self.product.stock_stripes.order_by('stripe').values_list('available', flat=True)), [3, 3, 2, 2])
+        self.assertEqual(InventoryService.available_stock(self.product), 10)
+
+    def test_reservation_can_span_stripes(self):
+        """Test reserving more than any one stripe holds, then checking out."""
+        self.add(self.user, 7)
+        self.assertEqual(InventoryService.available_stock(self.product), 3)
+        self.assertEqual(StockReservation.objects.filter(cart__user=self.user).aggregate(n=Sum('quantity'))['n'], 7)
+
+        OrderService.checkout_cart(self.user)
+        self.assertEqual(InventoryService.available_stock(self.product), 3)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_cannot_oversell(self):
+        """Test that adding more than the unreserved stock fails and leaves the stock untouched."""
+        other = User.objects.create_user(username='otheruser', password='password')
+        self.add(self.user, 8)
+        with self.assertRaisesMessage(ValueError, f'Not enough stock for product #{self.product.id}.'):
+            self.add(other, 3)
+        self.assertEqual(InventoryService.available_stock(self.product), 2)
+        self.assertFalse(CartItem.objects.filter(cart__user=other).exists())
+
+    def test_expired_reservations_are_released(self):
+        """Test that expired reservations return their stock and checkout reserves the cart again."""
+        self.add(self.user, 6)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        out = io.StringIO()
+        call_command('release_reservations', stdout=out)
+        self.assertIn('Released 6 reserved units.', out.getvalue())
+        self.assertEqual(InventoryService.available_stock(self.product), 10)
+
+        OrderService.checkout_cart(self.user)
+        self.assertEqual(InventoryService.available_stock(self.product), 4)
+
+    def test_lines_are_reserved_in_product_order(self):
+        """Test that stock is reserved in product id order whatever the request order, to avoid deadlocks."""
+        other = Product.objects.create(name="Product 2", price=5.00)
+        InventoryService.set_stock(other, 10)
+        with mock.patch.object(InventoryService, 'reserve', wraps=InventoryService.reserve) as reserve:
+            CartService.add_items_to_cart(self.user, [
+                {'product_id': other.id, 'quantity': 1}, {'product_id': self.product.id, 'quantity': 1}
+            ])
+        self.assertEqual([c.args[1] for c in reserve.call_args_list], [self.product.id, other.id])
+
+    def test_deleting_carts_returns_reserved_stock(self):
+        """Test that carts deleted outside the services, by the admin or with their user, give their stock back."""
+        other = User.objects.create_user(username='otheruser', password='password')
+        self.add(self.user, 4)
+        self.add(other, 3)
+
+        admin_user = User.objects.create_superuser(username='admin', password='password')
+        self.client.force_login(admin_user)
+        response = self.client.post('/admin/store/cart/', {
+            'action': 'delete_selected', 'post': 'yes', '_selected_action': [Cart.objects.get(user=self.user).pk]
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(InventoryService.available_stock(self.product), 7)
+
+        other.delete()
+        self.assertEqual(InventoryService.available_stock(self.product), 10)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_untracked_products_are_unlimited(self):
+        """Test that products without stock stripes can always be added."""
+        product = Product.objects.create(name="Product 2", price=5.00)
+        CartService.add_items_to_cart(self.user, [{'product_id': product.id, 'quantity': 1000}])
+        self.assertIsNone(InventoryService.available_stock(product))
+        self.assertEqual(OrderService.checkout_cart(self.user).total_items_purchased, 1000)
+
+    def test_cleanup_carts_returns_stock(self):
+        """Test that deleting an abandoned cart returns the stock it held."""
+        self.add(self.user, 4)
+        Cart.objects.update(updated_at=timezone.now() - timedelta(days=60))
+        call_command('cleanup_carts', sleep=0, stdout=io.StringIO())
+        self.assertEqual(InventoryService.available_stock(self.product), 10)
+
+
+class AdminChangelistTestCase(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser(username='admin', password='password'))
+        self.product = Product.objects.create(name="Product 1", price=100.00)
+        self.coupon = CouponCode.objects.create(code='ADMIN1', order_n=1)
+
+    def create_rows(self, count):
+        for _ in range(count):
+            user = User.objects.create_user(username=f'user{User.objects.count()}', password='password')
+            CartService.add_items_to_cart(user, [{'product_id': self.product.id, 'quantity': 1}])
+            Order.objects.create(user=user, discount_code=self.coupon, total_amount=100.00)
+
+    def changelist_queries(self, model, query=''):
+        url = f'/admin/store/{model._meta.model_name}/{query}'
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        # Listing dates to drill down into would scan the whole table
+        self.assertFalse([query['sql'] for query in queries if 'DISTINCT' in query['sql']])
+        return len(queries)
+
+    def past_week_query(self, field):
+        since = timezone.localdate() - timedelta(days=7)
+        return f'?{field}__gte={since}&{field}__lt={timezone.localdate() + timedelta(days=1)}'
+
+    def test_changelist_query_count_does_not_grow_with_rows(self):
+        """Test that Order, Cart and CartItem changelist pages, also date-filtered, issue a fixed number of queries."""
+        pages = [
+            (Order, ''), (Cart, ''), (CartItem, ''),
+            (Order, self.past_week_query('created_at')), (Cart, self.past_week_query('updated_at')),
+        ]
+        self.create_rows(2)
+        few = {page: self.changelist_queries(*page) for page in pages}
+        self.create_rows(20)
+        for model, query in pages:
+            with self.subTest(model=model.__name__, query=query):
+                self.assertEqual(self.changelist_queries(model, query), few[model, query])
+                self.assertLessEqual(few[model, query], 8)
+
+    def test_filtered_order_changelist(self):
+        """Test the coupon and date filters on the order changelist."""
+        self.create_rows(3)
+        response = self.client.get(f"/admin/store/order/{self.past_week_query('created_at')}&has_coupon=yes")
+        self.assertEqual(response.context['cl'].result_count, 3)
+        response = self.client.get('/admin/store/order/?has_coupon=no')
+        self.assertEqual(response.context['cl'].result_count, 0)
+
+
+class CartEventLogTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.product1 = Product.objects.create(name="Product 1", price=100.00)
+        self.product2 = Product.objects.create(name="Product 2", price=200.00)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def record(self, *events):
+        return CartService.record_cart_events(self.user, [
+            {'product_id': product.id, 'action': action, 'quantity': quantity} for product, action, quantity in events
+        ])
+
+    def test_events_are_written_with_one_insert(self):
+        """Test that recording events reads prices and inserts, without touching the cart."""
+        with self.assertNumQueries(2):
+            self.record((self.product1, 'add', 2), (self.product2, 'add', 1))
+        self.assertFalse(Cart.objects.exists())
+        self.assertEqual(CartEvent.objects.count(), 2)
+
+    def test_events_are_folded_in_order(self):
+        """Test that add, set and remove events are applied in order and then deleted."""
+        CartService.add_items_to_cart(self.user, [{'product_id': self.product1.id, 'quantity': 1}])
+        self.record(
+            (self.product1, 'add', 2), (self.product2, 'add', 5), (self.product2, 'set', 2),
+            (self.product1, 'remove', 0), (self.product1, 'add', 4),
+        )
+
+        cart = CartService.apply_cart_events(self.user)
+        self.assertEqual(dict(cart.items.values_list('product_id', 'quantity')), {self.product1.id: 4, self.product2.id: 2})
+        self.assertEqual(cart.total_amount, 800.00)
+        self.assertFalse(CartEvent.objects.exists())
+
+    def test_api_records_events_and_reads_folded_cart(self):
+        """Test the events endpoint and that reading the cart applies pending events."""
+        response = self.client.post('/api/cart/events/', {'events': [
+            {'product_id': self.product1.id, 'action': 'add', 'quantity': 3},
+            {'product_id': self.product1.id, 'action': 'set', 'quantity': 2},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data, {'recorded': 2})
+
+        response = self.client.get('/api/cart/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['items'][0]['quantity'], 2)
+
+        response = self.client.post('/api/cart/events/', {'events': [{'product_id': 999, 'action': 'add'}]}, format='json')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.post('/api/cart/events/', {'events': [{'product_id': self.product1.id, 'action': 'drop'}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        for product_id in ([1], {'id': 1}, 1.5, True, '1'):
+            with self.subTest(product_id=product_id):
+                response = self.client.post(
+                    '/api/cart/events/', {'events': [{'product_id': product_id, 'action': 'add'}]}, format='json'
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('valid product_id', response.data['error'])
+
+    def test_checkout_applies_pending_events(self):
+        """Test that checkout folds events first and keeps the event-time price snapshot."""
+        self.record((self.product1, 'add', 2))
+        Product.objects.filter(pk=self.product1.pk).update(price=150.00)
+
+        order = OrderService.checkout_cart(self.user)
+        self.assertEqual(order.total_items_purchased, 2)
+        self.assertEqual(order.total_amount, 200.00)
+
+    @override_settings(INVENTORY_STOCK_STRIPES=2)
+    def test_removing_a_line_returns_reserved_stock(self):
+        """Test that a remove event gives the line's reserved stock back."""
+        InventoryService.set_stock(self.product1, 10)
+        CartService.add_items_to_cart(self.user, [{'product_id': self.product1.id, 'quantity': 4}])
+        self.record((self.product1, 'remove', 0))
+
+        CartService.apply_cart_events(self.user)
+        self.assertEqual(InventoryService.available_stock(self.product1), 10)
+
+    @override_settings(INVENTORY_STOCK_STRIPES=2)
+    def test_applying_events_reserves_stock(self):
+        """Test that folding reserves added stock and leaves lines the stock cannot cover for checkout to reject."""
+        InventoryService.set_stock(self.product1, 10)
+        InventoryService.set_stock(self.product2, 1)
+        CartService.add_items_to_cart(self.user, [{'product_id': self.product1.id, 'quantity': 2}])
+        self.record((self.product1, 'add', 3), (self.product2, 'add', 2))
+
+        cart = CartService.apply_cart_events(self.user)
+        self.assertEqual(dict(cart.items.values_list('product_id', 'quantity')), {self.product1.id: 5, self.product2.id: 2})
+        self.assertEqual(InventoryService.available_stock(self.product1), 5)
+        self.assertEqual(InventoryService.available_stock(self.product2), 1)
+
+        with self.assertRaisesMessage(ValueError, f"Not enough stock for product #{self.product2.id}."):
+            OrderService.checkout_cart(self.user)
+
+    def test_compact_cart_events(self):
+        """Test that the compaction command folds every user's pending events."""
+        other = User.objects.create_user(username='otheruser', password='password')
+        self.record((self.product1, 'add', 1))
+        CartService.record_cart_events(other, [{'product_id': self.product2.id, 'action': 'add', 'quantity': 3}])
+
+        out = io.StringIO()
+        call_command('compact_cart_events', batch_size=1, stdout=out)
+        self.assertIn('Compacted the event logs of 2 carts.', out.getvalue())
+        self.assertFalse(CartEvent.objects.exists())
+        self.assertEqual(Cart.objects.get(user=other).total_amount, 600.00)
+
+
+@modify_settings(MIDDLEWARE={'append': 'store.middleware.ServiceProfilingMiddleware'})
+class ServiceProfilingTestCase(TestCase):
+    def setUp(self):
+        self.profile_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.profile_dir.cleanup)
+        self.enterContext(override_settings(SERVICE_PROFILE_DIR=self.profile_dir.name))
+
+        self.product = Product.objects.create(name="Product 1", price=100.00)
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.admin = User.objects.create_user(username='admin', password='password', is_staff=True)
+        self.client = APIClient()
+
+    def profiles(self):
+        return sorted(p.name for p in Path(self.profile_dir.name).iterdir())
+
+    def add_items(self, user, **headers):
+        self.client.force_authenticate(user=user)
+        return self.client.post('/api/cart/add-items/', {'products': [{'product_id': self.product.id, 'quantity': 1}]},
+                                format='json', headers=headers)
+
+    def test_header_profiles_staff_requests_only(self):
+        """Test that the profiling header is honoured for staff users and ignored for everyone else."""
+        response = self.add_items(self.user, **{'X-Profile-Services': '1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.profiles(), [])
+
+        response = self.add_items(self.admin, **{'X-Profile-Services': '1'})
+        profiles = self.profiles()
+        self.assertEqual(len(profiles), 1)
+        self.assertIn('CartService.add_items_to_cart-header', profiles[0])
+        self.assertEqual(response['X-Service-Profiles'], profiles[0])
+
+        # Nested service calls are part of the outer profile
+        stats = pstats.Stats(str(Path(self.profile_dir.name) / profiles[0]))
+        self.assertTrue(any(name == 'apply_cart_events' for _, _, name in stats.stats))
+
+    @override_settings(SERVICE_PROFILE_SAMPLE_RATE=1.0, SERVICE_PROFILE_FORMAT='collapsed')
+    def test_sampled_collapsed_stacks(self):
+        """Test sampled profiling writing flamegraph-ready collapsed stacks."""
+        OrderService.generate_report()
+
+        profiles = self.profiles()
+        self.assertEqual(len(profiles), 1)
+        self.assertTrue(profiles[0].endswith('-OrderService.generate_report-sample-%d.collapsed' % os.getpid()))
+        lines = (Path(self.profile_dir.name) / profiles[0]).read_text().splitlines()
+        self.assertTrue(lines)
+        for line in lines:
+            stack, weight = line.rsplit(' ', 1)
+            self.assertTrue(int(weight) > 0)
+        self.assertTrue(any('generate_report' in line.split(';')[0] for line in lines))
+
+    def test_no_profiles_without_trigger(self):
+        """Test that service calls are not profiled unless requested or sampled."""
+        self.add_items(self.admin)
+        self.assertEqual(self.profiles(), [])
+
+    @override_settings(SERVICE_PROFILE_SAMPLE_RATE=1.0)
+    def test_concurrent_calls_run_unprofiled(self):
+        """Test that a call made while another thread is profiling runs unprofiled instead of failing."""
+        started, release = threading.Event(), threading.Event()
+
+        def slow_service():
+            started.set()
+            release.wait(5)
+            return 'slow'
+
+        slow = profiled('Test.slow_service', slow_service)
+        fast = profiled('Test.fast_service', lambda: 'fast')
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            slow_result = executor.submit(slow)
+            self.assertTrue(started.wait(5))
+            self.assertEqual(fast(), 'fast')
+            release.set()
+            self.assertEqual(slow_result.result(5), 'slow')
+
+        profiles = self.profiles()
+        self.assertEqual(len(profiles), 1)
+        self.assertIn('Test.slow_service', profiles[0])
+
+    @override_settings(SERVICE_PROFILE_SAMPLE_RATE=1.0)
+    def test_call_runs_when_another_profiler_is_active(self):
+        """Test that a call still runs when cProfile cannot hook the interpreter."""
+        error = ValueError('Another profiling tool is already active')
+        with mock.patch('cProfile.Profile.enable', side_effect=error):
+            self.assertEqual(profiled('Test.service', lambda: 'ok')(), 'ok')
+        self.assertEqual(self.profiles(), [])
+
+    @override_settings(SERVICE_PROFILE_SAMPLE_RATE=1.0, SERVICE_PROFILE_FORMAT='flamegraph')
+    def test_bad_profile_format_does_not_fail_the_call(self):
+        """Test that a misconfigured format is rejected at startup and only logged by profiled calls."""
+        with self.assertRaises(ImproperlyConfigured):
+            check_profile_settings()
+        with self.assertLogs('store.profiling', 'ERROR'):
+            self.assertEqual(profiled('Test.service', lambda: 'ok')(), 'ok')
+        self.assertEqual(self.profiles(), [])
+
+    def test_services_do_not_import_the_profiler(self):
+        """Test that importing the services and middleware leaves cProfile and pstats unimported."""
+        script = (
+            'import sys, django; django.setup(); import store.services, store.middleware; '
+            'print(sorted({"cProfile", "pstats"} & set(sys.modules)))'
+        )
+        result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), '[]')
+
+    def test_rotation_keeps_newest_profiles(self):
+        """Test that rotation deletes the oldest profiles once the directory is over its size limit."""
+        directory = Path(self.profile_dir.name)
+        for n in range(5):
+            path = directory / f'profile{n}.prof'
+            path.write_bytes(b'x' * 100)
+            os.utime(path, (n, n))
+        (directory / 'notes.txt').write_bytes(b'x' * 1000)
+
+        rotate_profiles(directory, 250)
+        self.assertEqual(self.profiles(), ['notes.txt', 'profile3.prof', 'profile4.prof'])
+
+
+class CurrencyTestCase(TestCase):
+    def setUp(self):
+        # Rates cached by an earlier test outlive its rolled-back rows
+        invalidate_rates()
+        self.addCleanup(invalidate_rates)
+
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as rates_file:
+            json.dump({'base': 'USD', 'rates': {'EUR': '0.9', 'jpy': 150}}, rates_file)
+        self.addCleanup(os.remove, rates_file.name)
+        out = io.StringIO()
+        call_command('load_exchange_rates', rates_file.name, stdout=out)
+        self.assertIn('Loaded 2 exchange rates against USD.', out.getvalue())
+
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.admin = User.objects.create_superuser(username='admin', password='adminpassword')
+        self.product = Product.objects.create(name="Product 1", price=Decimal('10.99'))
+        self.client = APIClient()
+
+    def test_rates_are_cached_and_invalidated_on_save(self):
+        """Test that rates are served from the process cache until a rate is saved."""
+        self.assertEqual(get_rate('eur'), Decimal('0.9'))
+        with self.assertNumQueries(0):
+            self.assertEqual(get_rate('JPY'), Decimal('150'))
+            self.assertEqual(get_rate(None), Decimal('1'))
+
+        rate = ExchangeRate.objects.get(currency='EUR')
+        rate.rate = Decimal('0.95')
+        rate.save()
+        self.assertEqual(get_rate('EUR'), Decimal('0.95'))
+
+        with self.assertRaisesMessage(ValueError, "Unsupported currency 'GBP'."):
+            get_rate('GBP')
+
+    def test_invalid_rates_are_rejected(self):
+        """Test that unusable rates in a rate file fail the command cleanly and load nothing."""
+        for rate in ('NaN', 'sNaN', 'Infinity', '0', '-1', 'abc'):
+            with self.subTest(rate=rate), tempfile.NamedTemporaryFile('w', suffix='.json') as rates_file:
+                json.dump({'base': 'USD', 'rates': {'GBP': rate}}, rates_file)
+                rates_file.flush()
+                with self.assertRaisesMessage(CommandError, 'Invalid rate for GBP'):
+                    call_command('load_exchange_rates', rates_file.name, stdout=io.StringIO())
+        self.assertFalse(ExchangeRate.objects.filter(currency='GBP').exists())
+
+    @override_settings(EXCHANGE_RATE_CHECK_SECONDS=0)
+    def test_changes_from_other_processes_bump_the_version(self):
+        """Test that the cache reloads when the table's version changes without a signal in this process."""
+        get_rate('EUR')
+        ExchangeRate.objects.filter(currency='EUR').update(rate=Decimal('0.8'), updated_at=timezone.now() + timedelta(seconds=1))
+        self.assertEqual(get_rate('EUR'), Decimal('0.8'))
+
+        # An unchanged table costs only the version query
+        with self.assertNumQueries(1):
+            get_rate('EUR')
+
+    def test_cart_in_requested_currency(self):
+        """Test that every amount of the cart is converted with one rate."""
+        CartService.add_items_to_cart(self.user, [{'product_id': self.product.id, 'quantity': 3}])
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.get('/api/cart/', {'currency': 'eur'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['currency'], 'EUR')
+        self.assertEqual(response.data['total_amount'], '29.67')
+        self.assertEqual(response.data['items'][0]['unit_price'], '9.89')
+        self.assertEqual(response.data['items'][0]['product']['price'], '9.89')
+
+        response = self.client.get('/api/cart/', {'currency': 'XXX'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_checkout_response_shows_paid_amount(self):
+        """Test that the checkout response keeps total_amount in the store currency next to the amount paid."""
+        CartService.add_items_to_cart(self.user, [{'product_id': self.product.id, 'quantity': 1}])
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post('/api/cart/checkout/', {'currency': 'EUR'}, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        order = response.data['order']
+        self.assertEqual(order['total_amount'], '10.99')
+        self.assertEqual((order['paid_currency'], order['paid_total_amount']), ('EUR', '9.89'))
+        self.assertNotIn('currency', order)
+
+    def test_report_per_currency(self):
+        """Test that checkout records the currency and the report groups totals by it in one query."""
+        for currency in ('EUR', None, 'EUR'):
+            CartService.add_items_to_cart(self.user, [{'product_id': self.product.id, 'quantity': 1}])
+            order = OrderService.checkout_cart(self.user, currency=currency)
+        self.assertEqual((order.paid_currency, order.paid_exchange_rate), ('EUR', Decimal('0.9')))
+
+        get_rate('JPY')
+        with self.assertNumQueries(3):
+            report = OrderService.generate_report(currency='JPY')
+
+        self.assertEqual(report['currency'], 'JPY')
+        self.assertEqual(report['summary']['total_purchase_amount'], Decimal('4945.50'))
+        self.assertEqual(report['orders'][0]['total_purchase_amount'], Decimal('1648.50'))
+        self.assertEqual(report['by_currency'], [
+            {
+                'currency': 'EUR', 'orders': 2, 'total_items_purchased': 2,
+                'total_purchase_amount': Decimal('19.78'), 'total_discount_amount': Decimal('0.00'),
+                'converted_total_purchase_amount': Decimal('3297.00'),
+            },
+            {
+                'currency': 'USD', 'orders': 1, 'total_items_purchased': 1,
+                'total_purchase_amount': Decimal('10.99'), 'total_discount_amount': Decimal('0.00'),
+                'converted_total_purchase_amount': Decimal('1648.50'),
+            },
+        ])
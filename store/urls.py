@@ -12,6 +12,8 @@ urlpatterns = [
 ]
 
 # The above configuration will automatically create the following URLs:
+# GET /api/cart/ - Get the cart with recorded events applied
+# POST /api/cart/events/ - Record add/set/remove cart events
 # POST /api/cart/add_item/ - Add items to cart
 # POST /api/cart/{pk}/checkout/ - Checkout cart with optional discount code
 # POST /api/cart/generate_discount_code/ - Admin API to generate discount codes
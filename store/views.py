@@ -1,13 +1,38 @@
+from datetime import datetime, time
 from rest_framework import status, viewsets
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
-from django.db.models import Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from drf_yasg.utils import swagger_auto_schema
-from .models import Cart, Product, CouponCode, CartItem, Order
-from .serializers import CartSerializer, OrderSerializer, CouponCodeSerializer
-from .swagger import cart_add_items, cart_checkout, generate_discount_code, report
+from .models import Cart, Product, CouponCode
+from .serializers import FlatCartSerializer, FlatOrderSerializer, FlatCouponCodeSerializer
+from .swagger import cart_add_items, cart_checkout, cart_events, cart_retrieve, generate_discount_code, report
 from .services import CartService, OrderService, CouponService
+from .currency import get_rate, normalize_currency
+
+
+def parse_report_date(value):
+    """
+    Parse an optional YYYY-MM-DD report bound into an aware datetime at midnight.
+    """
+    if not value:
+        return None
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError(f"Invalid date '{value}', expected YYYY-MM-DD.")
+    return timezone.make_aware(datetime.combine(parsed, time.min))
+
+
+def currency_context(request):
+    """
+    Build the serializer context for showing amounts in the ?currency= of the request, if any.
+    """
+    currency = request.query_params.get('currency')
+    if not currency:
+        return {}
+    return {'currency': normalize_currency(currency), 'exchange_rate': get_rate(currency)}
 
 
 class CartViewSet(viewsets.ViewSet):
@@ -16,6 +41,43 @@ class CartViewSet(viewsets.ViewSet):
     """
     permission_classes = (IsAuthenticated,)
 
+    @swagger_auto_schema(**cart_retrieve)
+    def list(self, request):
+        """
+        Return the user's cart with all recorded cart events applied.
+        """
+        try:
+            context = currency_context(request)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        cart = CartService.apply_cart_events(request.user)
+        if cart is None:
+            return Response({"error": "Cart not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(FlatCartSerializer(cart, context=context).data, status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(**cart_events)
+    @action(detail=False, methods=['post'], url_path='events')
+    def events(self, request):
+        """
+        Record add/set/remove changes to the user's cart without waiting on other writers.
+        """
+        events = request.data.get('events', [])
+
+        if not isinstance(events, list) or not events:
+            return Response(
+                {"error": "A list of events is required."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            recorded = CartService.record_cart_events(request.user, events)
+            return Response({"recorded": len(recorded)}, status=status.HTTP_202_ACCEPTED)
+        except Product.DoesNotExist as e:
+            return Response({"error": str(e)}, status=status.HTTP_404_NOT_FOUND)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
     @swagger_auto_schema(**cart_add_items)
     @action(detail=False, methods=['post'], url_path='add-items')
     def add_item(self, request):
@@ -32,8 +94,9 @@ class CartViewSet(viewsets.ViewSet):
             )
 
         try:
+            context = currency_context(request)
             cart = CartService.add_items_to_cart(user, products)
-            return Response(CartSerializer(cart).data, status=status.HTTP_200_OK)
+            return Response(FlatCartSerializer(cart, context=context).data, status=status.HTTP_200_OK)
         except Product.DoesNotExist as e:
             return Response({"error": str(e)}, status=status.HTTP_404_NOT_FOUND)
         except ValueError as e:
@@ -47,12 +110,13 @@ class CartViewSet(viewsets.ViewSet):
         """
         user = request.user
         coupon_code = request.data.get('coupon_code', '').strip()
+        currency = request.data.get('currency')
 
         try:
-            order = OrderService.checkout_cart(user, coupon_code)
+            order = OrderService.checkout_cart(user, coupon_code, currency=currency)
             return Response(
                 {
-                    'order': OrderSerializer(order).data,
+                    'order': FlatOrderSerializer(order).data,
                     'message': f'Order #{order.order_number} created successfully'
                 },
                 status=status.HTTP_201_CREATED
@@ -100,8 +164,16 @@ class CartViewSet(viewsets.ViewSet):
             return Response({"error": "Admin access required"}, status=status.HTTP_403_FORBIDDEN)
 
         try:
-            report_data = OrderService.generate_report()
+            start = parse_report_date(request.query_params.get('start'))
+            end = parse_report_date(request.query_params.get('end'))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            report_data = OrderService.generate_report(start=start, end=end, currency=request.query_params.get('currency'))
             return Response(report_data, status=status.HTTP_200_OK)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -116,5 +188,5 @@ class CartViewSet(viewsets.ViewSet):
         Retrieve all unused coupon codes and their discount percentages.
         """
         unused_coupons = CouponCode.objects.filter(is_used=False)
-        serializer = CouponCodeSerializer(unused_coupons, many=True)
+        serializer = FlatCouponCodeSerializer(unused_coupons, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -59,6 +59,26 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Django REST Framework
+# FastJSONRenderer uses orjson when installed (poetry install --extras fast) and the stdlib otherwise.
+
+REST_FRAMEWORK = {
+    "DEFAULT_RENDERER_CLASSES": [
+        "store.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+}
+
+# drf_yasg: lets `manage.py generate_swagger` write the same schema the /swagger/ endpoints serve.
+
+SWAGGER_SETTINGS = {
+    "DEFAULT_INFO": "store.swagger.api_info",
+}
+
+# Public base URL of the API (e.g. https://api.unicart.com) used as the schema's host and scheme. When unset
+# they are taken from each request.
+SWAGGER_API_URL = env("SWAGGER_API_URL", default=None)
+
 ROOT_URLCONF = 'unicart.urls'
 
 TEMPLATES = [
@@ -84,9 +104,55 @@ WSGI_APPLICATION = 'unicart.wsgi.application'
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
 DATABASES = {
-   "default": env.db(engine="django.db.backends.postgresql"),
+   "default": env.db(),
 }
 
+# Optional read replicas, e.g. DATABASE_REPLICA_URLS='postgres://replica1/db,postgres://replica2/db'.
+# Catalog, listing and report reads go to a replica; cart and checkout traffic stays on the primary.
+DATABASE_REPLICAS = []
+for index, replica_url in enumerate(env.list("DATABASE_REPLICA_URLS", default=[])):
+    alias = f"replica_{index}"
+    DATABASES[alias] = env.db_url_config(replica_url)
+    DATABASES[alias]["TEST"] = {"MIRROR": "default"}
+    DATABASE_REPLICAS.append(alias)
+
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ["store.routers.ReplicaRouter"]
+    MIDDLEWARE.append("store.middleware.ReplicaPinningMiddleware")
+
+# How long a client keeps reading from the primary after one of its writes.
+REPLICA_PIN_SECONDS = env.int("REPLICA_PIN_SECONDS", default=5)
+
+# Carts untouched for this many days are expired and removed by the cleanup_carts command.
+CART_EXPIRY_DAYS = env.int("CART_EXPIRY_DAYS", default=30)
+
+# Inventory: each tracked product's stock is split across this many counter rows, and stock reserved by
+# adding to a cart is held for this many seconds of cart inactivity.
+INVENTORY_STOCK_STRIPES = env.int("INVENTORY_STOCK_STRIPES", default=8)
+STOCK_RESERVATION_TTL_SECONDS = env.int("STOCK_RESERVATION_TTL_SECONDS", default=900)
+
+# Admin changelists of tables with at least this many rows (per the Postgres planner) show an estimated total.
+ADMIN_ESTIMATED_COUNT_THRESHOLD = env.int("ADMIN_ESTIMATED_COUNT_THRESHOLD", default=100000)
+
+# Currencies: prices and stored totals are in BASE_CURRENCY. Exchange rates live in the ExchangeRate table
+# (admin, or `manage.py load_exchange_rates`, which defaults to EXCHANGE_RATES_FILE) and are cached in each
+# process, which checks the table's version for changes at most every EXCHANGE_RATE_CHECK_SECONDS.
+BASE_CURRENCY = env("BASE_CURRENCY", default="USD").upper()
+EXCHANGE_RATES_FILE = env("EXCHANGE_RATES_FILE", default=None)
+EXCHANGE_RATE_CHECK_SECONDS = env.int("EXCHANGE_RATE_CHECK_SECONDS", default=60)
+
+# Opt-in service profiling: with SERVICE_PROFILE_DIR set, CartService, OrderService and CouponService calls
+# are profiled for staff requests sending an X-Profile-Services header and for a sampled fraction of all
+# calls. Profiles are pstats files (view with snakeviz or pstats) or collapsed stacks (flamegraph.pl,
+# speedscope); the oldest are deleted once the directory exceeds SERVICE_PROFILE_MAX_BYTES.
+SERVICE_PROFILE_DIR = env("SERVICE_PROFILE_DIR", default=None)
+SERVICE_PROFILE_SAMPLE_RATE = env.float("SERVICE_PROFILE_SAMPLE_RATE", default=0.0)
+SERVICE_PROFILE_FORMAT = env("SERVICE_PROFILE_FORMAT", default="pstats")
+SERVICE_PROFILE_MAX_BYTES = env.int("SERVICE_PROFILE_MAX_BYTES", default=100 * 1024 * 1024)
+
+if SERVICE_PROFILE_DIR:
+    MIDDLEWARE.append("store.middleware.ServiceProfilingMiddleware")
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -16,13 +16,13 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from store.swagger import schema_view
+from store.swagger import lazy_schema_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('store.urls')),
     # Swagger documentation URLs
-    path('swagger<format>/', schema_view.without_ui(cache_timeout=0), name='schema-json'),
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    path('swagger<format>/', lazy_schema_view(), name='schema-json'),
+    path('swagger/', lazy_schema_view('swagger'), name='schema-swagger-ui'),
+    path('redoc/', lazy_schema_view('redoc'), name='schema-redoc'),
 ]